@@ -1,13 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
 
 import aiohttp
 
-from broker_report_xml import parse_broker_report_xml
+from broker_report_xml import ParsedBrokerTrade, parse_broker_report_xml
 from common_utils import pick_stock_candidate_by_isin
-from db import add_trade, upsert_instrument
-from moex_iss import ASSET_TYPE_METAL, search_securities
+from db import add_trades_bulk, upsert_instruments_bulk
+from moex_iss import ASSET_TYPE_METAL, moex_session, search_securities
 
 
 @dataclass(frozen=True)
@@ -24,71 +25,75 @@ async def import_broker_xml_trades(
     db_dsn: str,
     user_id: int,
     file_name: str,
-    xml_bytes: bytes,
+    xml_bytes: bytes | bytearray,
+    session: aiohttp.ClientSession | None = None,
 ) -> BrokerImportResult:
-    parsed_trades = parse_broker_report_xml(xml_bytes)
+    # Parsing is CPU-bound; keep the event loop free for other requests meanwhile.
+    parsed_trades = await asyncio.to_thread(parse_broker_report_xml, xml_bytes)
     if not parsed_trades:
         raise ValueError("В выписке не найдены сделки в блоке trades_finished.")
 
-    imported = 0
-    duplicates = 0
     skipped = 0
     unresolved_isins: set[str] = set()
     stock_cache: dict[str, dict | None] = {}
     source_name = (file_name or "broker_report.xml")[:255]
 
-    async with aiohttp.ClientSession() as session:
-        for trade in parsed_trades:
-            secid = None
-            boardid = ""
-            shortname = (trade.asset_name or "").strip() or None
-            asset_type = trade.asset_type
+    # ISIN lookups are independent, so resolve every unique ISIN concurrently up front.
+    unique_isins = list(dict.fromkeys(t.isin_reg for t in parsed_trades if t.asset_type != ASSET_TYPE_METAL))
+    if unique_isins:
+        if session is None:
+            async with moex_session() as own_session:
+                results = await asyncio.gather(*(search_securities(own_session, isin) for isin in unique_isins))
+        else:
+            results = await asyncio.gather(*(search_securities(session, isin) for isin in unique_isins))
+        for isin, candidates in zip(unique_isins, results):
+            stock_cache[isin] = pick_stock_candidate_by_isin(candidates, isin)
 
-            if asset_type == ASSET_TYPE_METAL:
-                secid = trade.metal_secid
+    resolved: list[tuple[ParsedBrokerTrade, str, str, str | None]] = []
+    for trade in parsed_trades:
+        secid = None
+        boardid = ""
+        shortname = (trade.asset_name or "").strip() or None
+        asset_type = trade.asset_type
+
+        if asset_type == ASSET_TYPE_METAL:
+            secid = trade.metal_secid
+        else:
+            cached = stock_cache.get(trade.isin_reg)
+            if cached:
+                secid = str(cached.get("secid") or "").strip() or None
+                boardid = str(cached.get("boardid") or "").strip()
+                if not shortname:
+                    shortname = (cached.get("shortname") or cached.get("name") or "").strip() or None
             else:
-                cached = stock_cache.get(trade.isin_reg)
-                if cached is None and trade.isin_reg not in stock_cache:
-                    candidates = await search_securities(session, trade.isin_reg)
-                    cached = pick_stock_candidate_by_isin(candidates, trade.isin_reg)
-                    stock_cache[trade.isin_reg] = cached
-                else:
-                    cached = stock_cache.get(trade.isin_reg)
-                if cached:
-                    secid = str(cached.get("secid") or "").strip() or None
-                    boardid = str(cached.get("boardid") or "").strip()
-                    if not shortname:
-                        shortname = (cached.get("shortname") or cached.get("name") or "").strip() or None
-                else:
-                    unresolved_isins.add(trade.isin_reg)
+                unresolved_isins.add(trade.isin_reg)
 
-            if not secid:
-                skipped += 1
-                continue
+        if not secid:
+            skipped += 1
+            continue
+        resolved.append((trade, secid, boardid, shortname))
 
-            instrument_id = await upsert_instrument(
-                db_dsn,
-                secid=secid,
-                isin=trade.isin_reg,
-                boardid=boardid,
-                shortname=shortname,
-                asset_type=asset_type,
-            )
-            was_inserted = await add_trade(
-                db_dsn,
-                user_id=user_id,
-                instrument_id=instrument_id,
-                trade_date=trade.trade_date,
-                qty=trade.qty,
-                price=trade.price,
-                commission=trade.commission,
-                external_trade_id=f"broker_xml:{trade.trade_no}",
-                import_source=source_name,
+    # Two batched round-trips instead of upsert_instrument + add_trade per row.
+    instrument_ids = await upsert_instruments_bulk(
+        db_dsn,
+        [(secid, trade.isin_reg, boardid, shortname, trade.asset_type) for trade, secid, boardid, shortname in resolved],
+    )
+    trade_rows = []
+    for trade, secid, boardid, _ in resolved:
+        norm_board = "" if trade.asset_type == ASSET_TYPE_METAL else boardid
+        trade_rows.append(
+            (
+                instrument_ids[(secid, norm_board, trade.asset_type)],
+                trade.trade_date,
+                trade.qty,
+                trade.price,
+                trade.commission,
+                f"broker_xml:{trade.trade_no}",
             )
-            if was_inserted:
-                imported += 1
-            else:
-                duplicates += 1
+        )
+    inserted_flags = await add_trades_bulk(db_dsn, user_id, trade_rows, import_source=source_name)
+    imported = sum(inserted_flags)
+    duplicates = len(inserted_flags) - imported
 
     return BrokerImportResult(
         file=source_name,
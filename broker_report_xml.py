@@ -42,15 +42,18 @@ def _to_ddmmyyyy(ts: str) -> str:
     return datetime.fromisoformat(ts).strftime("%d.%m.%Y")
 
 
-def parse_broker_report_xml(xml_bytes: bytes) -> list[ParsedBrokerTrade]:
+def parse_broker_report_xml(xml_bytes: bytes | bytearray) -> list[ParsedBrokerTrade]:
+    # expat reads the bytes directly (BOM and encoding declaration included),
+    # so the upload buffer is never copied into a decoded str first.
     try:
-        xml_text = xml_bytes.decode("utf-8-sig")
-    except UnicodeDecodeError as exc:
-        raise ValueError("Файл не похож на UTF-8 XML выписку") from exc
-
-    try:
-        root = ET.fromstring(xml_text)
+        root = ET.fromstring(xml_bytes)
     except ET.ParseError as exc:
+        # Undeclared non-UTF-8 bytes surface as a generic "invalid token" from
+        # expat; decode only on this failure path to keep the clearer message.
+        try:
+            str(xml_bytes, "utf-8-sig")
+        except UnicodeDecodeError:
+            raise ValueError("Файл не похож на UTF-8 XML выписку") from exc
         raise ValueError("Не удалось разобрать XML") from exc
 
     if root.tag != "report_broker":
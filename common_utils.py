@@ -2,6 +2,8 @@ from __future__ import annotations
 
 
 def safe_float(value, default: float = 0.0) -> float:
+    if type(value) is float:
+        return value
     try:
         return float(value)
     except (TypeError, ValueError):
@@ -529,6 +529,11 @@ def _pick_canonical_metal(rows: list[asyncpg.Record]) -> asyncpg.Record:
 
 
 async def _get_pool(db_dsn: str) -> asyncpg.Pool:
+    # Lock-free fast path: every helper calls this, and once the pool exists the
+    # lock would only serialize concurrent handlers for no reason.
+    pool = _pools.get(db_dsn)
+    if pool is not None:
+        return pool
     async with _pools_lock:
         pool = _pools.get(db_dsn)
         if pool is None:
@@ -1083,6 +1088,206 @@ async def add_trade(
         raise
 
 
+@db_operation()
+async def upsert_instruments_bulk(
+    db_path: str,
+    rows: list[tuple[str, str | None, str | None, str | None, str]],
+) -> dict[tuple[str, str, str], int]:
+    """
+    rows: (secid, isin, boardid, shortname, asset_type).
+    Возвращает {(secid, boardid, asset_type): instrument_id} с нормализованным boardid.
+    """
+    if not rows:
+        return {}
+    try:
+        pool = await _get_pool(db_path)
+        # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement, so dedupe first.
+        dedup: dict[tuple[str, str, str], tuple[str | None, str | None]] = {}
+        for secid, isin, boardid, shortname, asset_type in rows:
+            norm_board = "" if asset_type == "metal" else _norm_boardid(boardid)
+            key = (secid, norm_board, asset_type)
+            prev_isin, prev_shortname = dedup.get(key, (None, None))
+            dedup[key] = (isin or prev_isin, shortname or prev_shortname)
+        keys = list(dedup.keys())
+        async with pool.acquire() as conn:
+            result = await conn.fetch(
+                """
+                INSERT INTO instruments (secid, isin, boardid, shortname, asset_type)
+                SELECT x.secid, x.isin, x.boardid, x.shortname, x.asset_type
+                FROM UNNEST($1::text[], $2::text[], $3::text[], $4::text[], $5::text[])
+                  AS x(secid, isin, boardid, shortname, asset_type)
+                ON CONFLICT (secid, boardid, asset_type)
+                DO UPDATE SET
+                  isin = COALESCE(EXCLUDED.isin, instruments.isin),
+                  shortname = COALESCE(EXCLUDED.shortname, instruments.shortname)
+                RETURNING id, secid, boardid, asset_type
+                """,
+                [k[0] for k in keys],
+                [dedup[k][0] for k in keys],
+                [k[1] for k in keys],
+                [dedup[k][1] for k in keys],
+                [k[2] for k in keys],
+            )
+        return {(r["secid"], r["boardid"], r["asset_type"]): int(r["id"]) for r in result}
+    except _LOGGABLE_DB_ERRORS:
+        logger.exception("Failed upsert_instruments_bulk rows=%s", len(rows))
+        raise
+
+
+def _bulk_insert_flags(external_ids: list[str], inserted_ids: set[str]) -> list[bool]:
+    # The same external id may repeat inside one batch; only its first occurrence is inserted.
+    pending = set(inserted_ids)
+    flags: list[bool] = []
+    for external_id in external_ids:
+        flags.append(external_id in pending)
+        pending.discard(external_id)
+    return flags
+
+
+def _fold_positions(
+    state: dict[int, tuple[float, float]],
+    rows: list[tuple[int, str, float, float, float, str]],
+    flags: list[bool],
+) -> dict[int, tuple[float, float]]:
+    """
+    Применяет вставленные сделки к {instrument_id: (total_qty, total_cost)} так же,
+    как последовательные вызовы add_trade.
+    """
+    out = dict(state)
+    for row, ok in zip(rows, flags):
+        if not ok:
+            continue
+        iid = int(row[0])
+        qty_f = float(row[2])
+        qty, cost = out.get(iid, (0.0, 0.0))
+        qty += qty_f
+        cost += qty_f * float(row[3]) + float(row[4])
+        # add_trade drops a position once it nets to zero, so a later buy starts from a clean cost basis.
+        out[iid] = (qty, cost) if abs(qty) > 1e-12 else (0.0, 0.0)
+    return out
+
+
+@db_operation()
+async def add_trades_bulk(
+    db_path: str,
+    user_id: int,
+    rows: list[tuple[int, str, float, float, float, str]],
+    import_source: str | None = None,
+) -> list[bool]:
+    """
+    rows: (instrument_id, trade_date, qty, price, commission, external_trade_id).
+    Возвращает флаги вставки в порядке rows (False для дубликатов по external_trade_id).
+    Позиции пересчитываются так же, как при последовательных вызовах add_trade,
+    но avg_price заполняется и для новой позиции (add_trade оставляет там 0).
+    external_trade_id обязателен: без него вставку нельзя сопоставить со строкой.
+    """
+    if not rows:
+        return []
+    if any(not r[5] for r in rows):
+        raise ValueError("external_trade_id is required for bulk trade import")
+    try:
+        pool = await _get_pool(db_path)
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                user_ref_id, portfolio_id = await _ensure_user_context(conn, int(user_id))
+                inserted_rows = await conn.fetch(
+                    """
+                    INSERT INTO trades (
+                      user_id, user_ref_id, portfolio_id, instrument_id,
+                      external_trade_id, import_source, trade_date, trade_date_date, qty, price, commission
+                    )
+                    SELECT $1, $2, $3, x.instrument_id, x.external_trade_id, $4,
+                           x.trade_date, x.trade_date_date, x.qty, x.price, x.commission
+                    FROM UNNEST(
+                      $5::bigint[],
+                      $6::text[],
+                      $7::text[],
+                      $8::date[],
+                      $9::double precision[],
+                      $10::double precision[],
+                      $11::double precision[]
+                    ) AS x(instrument_id, external_trade_id, trade_date, trade_date_date, qty, price, commission)
+                    ON CONFLICT (user_id, external_trade_id) DO NOTHING
+                    RETURNING external_trade_id
+                    """,
+                    int(user_id),
+                    user_ref_id,
+                    portfolio_id,
+                    (import_source or None),
+                    [int(r[0]) for r in rows],
+                    [r[5] for r in rows],
+                    [r[1] for r in rows],
+                    [_parse_date_ddmmyyyy(r[1]) or _parse_date_iso(r[1]) for r in rows],
+                    [float(r[2]) for r in rows],
+                    [float(r[3]) for r in rows],
+                    [float(r[4]) for r in rows],
+                )
+                flags = _bulk_insert_flags(
+                    [r[5] for r in rows],
+                    {r["external_trade_id"] for r in inserted_rows},
+                )
+                if not any(flags):
+                    return flags
+
+                touched = sorted({int(r[0]) for r, ok in zip(rows, flags) if ok})
+                current = await conn.fetch(
+                    """
+                    SELECT instrument_id, total_qty, total_cost
+                    FROM user_positions
+                    WHERE portfolio_id = $1 AND instrument_id = ANY($2::bigint[])
+                    FOR UPDATE
+                    """,
+                    portfolio_id,
+                    touched,
+                )
+                state = _fold_positions(
+                    {int(r["instrument_id"]): (float(r["total_qty"]), float(r["total_cost"])) for r in current},
+                    rows,
+                    flags,
+                )
+                keep = [iid for iid in touched if abs(state[iid][0]) > 1e-12]
+                drop = [iid for iid in touched if abs(state[iid][0]) <= 1e-12]
+                if keep:
+                    await conn.execute(
+                        """
+                        INSERT INTO user_positions (portfolio_id, instrument_id, total_qty, total_cost, avg_price, updated_at)
+                        SELECT $1, x.instrument_id, x.total_qty, x.total_cost, x.total_cost / x.total_qty, NOW()
+                        FROM UNNEST($2::bigint[], $3::double precision[], $4::double precision[])
+                          AS x(instrument_id, total_qty, total_cost)
+                        ON CONFLICT (portfolio_id, instrument_id) DO UPDATE
+                        SET total_qty = EXCLUDED.total_qty,
+                            total_cost = EXCLUDED.total_cost,
+                            avg_price = EXCLUDED.avg_price,
+                            updated_at = NOW()
+                        """,
+                        portfolio_id,
+                        keep,
+                        [state[iid][0] for iid in keep],
+                        [state[iid][1] for iid in keep],
+                    )
+                if drop:
+                    await conn.execute(
+                        """
+                        DELETE FROM user_positions
+                        WHERE portfolio_id = $1
+                          AND instrument_id = ANY($2::bigint[])
+                        """,
+                        portfolio_id,
+                        drop,
+                    )
+        logger.info(
+            "Trades inserted in bulk: user=%s inserted=%s duplicates=%s source=%s",
+            user_id,
+            sum(flags),
+            len(flags) - sum(flags),
+            import_source,
+        )
+        return flags
+    except _LOGGABLE_DB_ERRORS:
+        logger.exception("Failed add_trades_bulk user=%s count=%s", user_id, len(rows))
+        raise
+
+
 @db_operation()
 async def get_position_agg(db_path: str, user_id: int, instrument_id: int):
     """
@@ -2266,6 +2471,36 @@ async def list_budget_incomes(db_path: str, user_id: int) -> list[dict[str, Any]
         raise
 
 
+@db_operation()
+async def list_budget_incomes_with_total(db_path: str, user_id: int) -> tuple[list[dict[str, Any]], float]:
+    try:
+        pool = await _get_pool(db_path)
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, kind, title, amount_monthly, SUM(amount_monthly) OVER () AS total
+                FROM budget_incomes
+                WHERE user_id = $1 AND active = TRUE
+                ORDER BY id DESC
+                """,
+                int(user_id),
+            )
+        items = [
+            {
+                "id": int(row["id"]),
+                "kind": row["kind"] or "other",
+                "title": row["title"],
+                "amount_monthly": float(row["amount_monthly"] or 0.0),
+            }
+            for row in rows
+        ]
+        total = float(rows[0]["total"] or 0.0) if rows else 0.0
+        return items, total
+    except _LOGGABLE_DB_ERRORS:
+        logger.exception("Failed list_budget_incomes_with_total user=%s", user_id)
+        raise
+
+
 @db_operation()
 async def add_budget_income(db_path: str, user_id: int, kind: str, title: str, amount_monthly: float) -> int:
     try:
@@ -2721,6 +2956,36 @@ async def list_budget_savings(db_path: str, user_id: int) -> list[dict[str, Any]
         raise
 
 
+@db_operation()
+async def list_budget_savings_with_total(db_path: str, user_id: int) -> tuple[list[dict[str, Any]], float]:
+    try:
+        pool = await _get_pool(db_path)
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, kind, title, amount, SUM(amount) OVER () AS total
+                FROM budget_savings
+                WHERE user_id = $1 AND active = TRUE
+                ORDER BY id DESC
+                """,
+                int(user_id),
+            )
+        items = [
+            {
+                "id": int(row["id"]),
+                "kind": row["kind"] or "other",
+                "title": row["title"],
+                "amount": float(row["amount"] or 0.0),
+            }
+            for row in rows
+        ]
+        total = float(rows[0]["total"] or 0.0) if rows else 0.0
+        return items, total
+    except _LOGGABLE_DB_ERRORS:
+        logger.exception("Failed list_budget_savings_with_total user=%s", user_id)
+        raise
+
+
 @db_operation()
 async def add_budget_saving(db_path: str, user_id: int, kind: str, title: str, amount: float) -> int:
     try:
@@ -3106,6 +3371,29 @@ async def update_budget_fund(
         raise
 
 
+@db_operation()
+async def increment_budget_fund_saved(db_path: str, user_id: int, fund_id: int, delta: float) -> float | None:
+    try:
+        pool = await _get_pool(db_path)
+        async with pool.acquire() as conn:
+            new_total = await conn.fetchval(
+                """
+                UPDATE budget_funds
+                SET already_saved = already_saved + $1,
+                    updated_at = NOW()
+                WHERE id = $2 AND user_id = $3 AND status <> 'deleted'
+                RETURNING already_saved
+                """,
+                float(delta),
+                int(fund_id),
+                int(user_id),
+            )
+        return float(new_total) if new_total is not None else None
+    except _LOGGABLE_DB_ERRORS:
+        logger.exception("Failed increment_budget_fund_saved user=%s fund=%s", user_id, fund_id)
+        raise
+
+
 @db_operation()
 async def close_budget_month(
     db_path: str,
@@ -110,6 +110,7 @@ from moex_iss import (
     ASSET_TYPE_METAL,
     ASSET_TYPE_STOCK,
     DELAYED_WARNING_TEXT,
+    close_moex_session,
     delayed_data_used,
     get_moex_index_return_percent,
     get_stock_movers_by_date,
@@ -117,6 +118,7 @@ from moex_iss import (
     get_last_price_by_asset_type,
     get_last_price_fiat,
     get_usd_rub_rate,
+    moex_session,
     reset_data_source_flags,
     search_fiat,
     search_metals,
@@ -366,7 +368,7 @@ async def build_asset_dynamics_text(chosen: dict, asset_type: str) -> str:
     ]
 
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         current = await get_last_price_by_asset_type(session, secid, boardid, asset_type)
         lines = [f"{name} ({secid})"]
         lines.append(f"Текущая цена: {money(current)} RUB" if current is not None else "Текущая цена: нет данных")
@@ -603,7 +605,7 @@ async def cmd_top_movers(message: Message):
 async def cmd_usd_rub(message: Message):
     reset_data_source_flags()
     try:
-        async with aiohttp.ClientSession() as session:
+        async with moex_session() as session:
             rate = await get_usd_rub_rate(session)
     except Exception:
         logger.exception("Failed to load USD/RUB rate")
@@ -780,7 +782,7 @@ async def on_alert_query(message: Message, state: FSMContext):
     data = await state.get_data()
     asset_type = data.get("asset_type") or ASSET_TYPE_STOCK
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         if asset_type == ASSET_TYPE_METAL:
             cands = await search_metals(session, q)
         elif asset_type == ASSET_TYPE_FIAT:
@@ -999,7 +1001,7 @@ async def on_top_movers_date_pick(call: CallbackQuery):
         return
 
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         movers = await get_stock_movers_by_date(session, selected, boardid="TQBR")
 
     if not movers:
@@ -1271,7 +1273,7 @@ async def on_lookup_query(message: Message, state: FSMContext):
     data = await state.get_data()
     asset_type = data.get("asset_type") or ASSET_TYPE_STOCK
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         if asset_type == ASSET_TYPE_METAL:
             cands = await search_metals(session, q)
         else:
@@ -1448,7 +1450,7 @@ async def on_portfolio_map_share(call: CallbackQuery):
     till_date = datetime.now(MSK_TZ).date()
     moex_return_30d = None
     try:
-        async with aiohttp.ClientSession() as session:
+        async with moex_session() as session:
             moex_return_30d = await get_moex_index_return_percent(session, from_date, till_date)
     except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError):
         logger.warning("Failed loading IMOEX return for share card")
@@ -1635,7 +1637,7 @@ async def process_user_alerts(bot: Bot, user_id: int, now_utc: datetime):
         return
 
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         for alert in target_alerts:
             secid = alert["secid"]
             boardid = alert.get("boardid")
@@ -1938,7 +1940,7 @@ async def on_query(message: Message, state: FSMContext):
     asset_type = data.get("asset_type") or ASSET_TYPE_STOCK
 
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         if asset_type == ASSET_TYPE_METAL:
             cands = await search_metals(session, q)
         else:
@@ -2079,7 +2081,7 @@ async def on_confirm_save(call: CallbackQuery, state: FSMContext):
     )
 
     reset_data_source_flags()
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         last = await get_last_price_by_asset_type(
             session,
             instr["secid"],
@@ -2386,6 +2388,7 @@ async def main():
             pass
         if health_runner is not None:
             await health_runner.cleanup()
+        await close_moex_session()
         await close_pools()
 
 if __name__ == "__main__":
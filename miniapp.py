@@ -1,15 +1,23 @@
 import asyncio
 import calendar
+import hashlib
+import heapq
 import logging
 import os
+import re
+import time
+from collections import OrderedDict
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from functools import partial
 from json import JSONDecodeError
+from operator import itemgetter
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable
 from zoneinfo import ZoneInfo
 
 import aiohttp
+import orjson
 from aiohttp import web
 
 from broker_import_service import import_broker_xml_trades
@@ -48,14 +56,15 @@ from db import (
     get_position_agg,
     get_user_alert_settings,
     get_user_positions,
+    increment_budget_fund_saved,
     list_active_app_texts,
     list_active_price_target_alerts,
     list_budget_funds,
     list_budget_expenses,
-    list_budget_incomes,
+    list_budget_incomes_with_total,
     list_budget_obligations,
     list_budget_history,
-    list_budget_savings,
+    list_budget_savings_with_total,
     list_loan_accounts,
     list_loan_actual_payments,
     list_loan_events,
@@ -86,9 +95,12 @@ from moex_iss import (
     ASSET_TYPE_FIAT,
     ASSET_TYPE_METAL,
     ASSET_TYPE_STOCK,
+    MOEX_REQUEST_HEADERS,
+    get_cached_last_price,
     get_history_prices_by_asset_type,
     get_last_price_by_asset_type,
     get_last_price_fiat,
+    get_last_prices_bulk,
     get_stock_movers_by_date,
     get_usd_rub_rate,
     search_fiat,
@@ -101,22 +113,51 @@ logger = logging.getLogger(__name__)
 
 TRADE_SIDE_BUY = "buy"
 TRADE_SIDE_SELL = "sell"
+_ALLOWED_ASSET_TYPES = frozenset({ASSET_TYPE_STOCK, ASSET_TYPE_METAL, ASSET_TYPE_FIAT})
+_ALLOWED_SIDES = frozenset({TRADE_SIDE_BUY, TRADE_SIDE_SELL})
 MAX_XML_UPLOAD_BYTES = 5 * 1024 * 1024
-_api_cache: dict[str, tuple[float, dict]] = {}
+# Boundaries and part headers around the file in a multipart body.
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+_api_cache: OrderedDict[tuple[str, ...], tuple[float, dict]] = OrderedDict()
+_USD_RUB_CACHE_KEY = ("usd_rub",)
+_inflight: dict[tuple[str, ...], asyncio.Future] = {}
+_background_tasks: set[asyncio.Task] = set()
 _API_CACHE_TTL_SEC = int((os.getenv("MINIAPP_API_CACHE_TTL_SEC") or "900").strip() or "900")
+_API_CACHE_REFRESH_AFTER_SEC = _API_CACHE_TTL_SEC / 3
 _API_CACHE_MAX_SIZE = int((os.getenv("MINIAPP_API_CACHE_MAX_SIZE") or "2048").strip() or "2048")
 _PRICE_LOAD_CONCURRENCY = int((os.getenv("MINIAPP_PRICE_LOAD_CONCURRENCY") or "12").strip() or "12")
 _INITDATA_MAX_AGE_SEC = int((os.getenv("MINIAPP_INITDATA_MAX_AGE_SEC") or "86400").strip() or "86400")
+# Currency sign, digit group separators and decimal comma are normalised in one pass.
+_MONEY_TEXT_TRANSLATE = str.maketrans({"₽": None, "_": None, " ": None, ",": "."})
+# Suffixes are stripped right to left: "млн" or "m" first, then one more "м".
+_MONEY_TEXT_RE = re.compile(r"(.*?)(м?(?:млн|m)?)", re.DOTALL)
+_auth_cache: OrderedDict[tuple[str, bytes], tuple[float, int]] = OrderedDict()
+_AUTH_CACHE_TTL_SEC = 30.0
+_AUTH_CACHE_MAX_SIZE = 4096
+_AUTH_DATE_RE = re.compile(r"(?:^|&)auth_date=(\d+)(?:&|$)")
+_PUBLIC_API_PATHS = frozenset({"/api/miniapp/loans/share/{token}"})
 _LOAN_RATE_LIMIT: dict[str, list[float]] = {}
 _LOAN_RATE_WINDOW_SEC = 60.0
 _LOAN_RATE_MAX_EVENTS = int((os.getenv("LOAN_RATE_MAX_EVENTS_PER_MIN") or "30").strip() or "30")
 MSK_TZ = ZoneInfo("Europe/Moscow")
 APP_DB_DSN: web.AppKey[str] = web.AppKey("db_dsn", str)
 APP_BOT_TOKEN: web.AppKey[str] = web.AppKey("bot_token", str)
+APP_HTTP_SESSION: web.AppKey[aiohttp.ClientSession] = web.AppKey("http_session", aiohttp.ClientSession)
+REQUEST_USER_ID: web.RequestKey[int] = web.RequestKey("miniapp_user_id", int)
+APP_MINIAPP_FILES: web.AppKey[dict[str, Path]] = web.AppKey("miniapp_files", dict)
+_MINIAPP_ROOT = Path(__file__).resolve().parent / "miniapp"
+# Asset URLs carry a ?v= version, so browsers may reuse them without revalidating.
+_MINIAPP_ASSET_CACHE_CONTROL = "public, max-age=3600"
+_utc_now_iso_cache: tuple[int, str] = (0, "")
 
 
 def _utc_now_iso() -> str:
-    return datetime.now(tz=timezone.utc).isoformat()
+    # as_of only needs second precision; format once per second instead of per response.
+    global _utc_now_iso_cache
+    now_sec = int(time.time())
+    if now_sec != _utc_now_iso_cache[0]:
+        _utc_now_iso_cache = (now_sec, datetime.fromtimestamp(now_sec, tz=timezone.utc).isoformat())
+    return _utc_now_iso_cache[1]
 
 
 def _is_postgres_dsn(dsn: str) -> bool:
@@ -127,37 +168,104 @@ def _today_msk() -> date:
     return datetime.now(MSK_TZ).date()
 
 
-def _cache_get(key: str) -> dict | None:
+def _cache_get(key: tuple[str, ...]) -> tuple[dict, float] | None:
     row = _api_cache.get(key)
     if not row:
         return None
-    ts, data = row
-    if asyncio.get_running_loop().time() - ts > _API_CACHE_TTL_SEC:
+    expires_at, data = row
+    now = time.monotonic()
+    if now > expires_at:
         _api_cache.pop(key, None)
         return None
-    return data
+    _api_cache.move_to_end(key)
+    return data, now - expires_at + _API_CACHE_TTL_SEC
 
 
-def _cache_set(key: str, data: dict) -> None:
-    now = asyncio.get_running_loop().time()
-    _api_cache[key] = (now, data)
-    if len(_api_cache) <= _API_CACHE_MAX_SIZE:
-        return
-    cutoff = now - _API_CACHE_TTL_SEC
-    stale_keys = [k for k, (ts, _) in _api_cache.items() if ts < cutoff]
-    for stale_key in stale_keys:
-        _api_cache.pop(stale_key, None)
-    if len(_api_cache) <= _API_CACHE_MAX_SIZE:
+def _cache_set(key: tuple[str, ...], data: dict) -> None:
+    _api_cache[key] = (time.monotonic() + _API_CACHE_TTL_SEC, data)
+    _api_cache.move_to_end(key)
+    # LRU order lives in the OrderedDict itself, so eviction is O(1) per extra entry.
+    while len(_api_cache) > _API_CACHE_MAX_SIZE:
+        _api_cache.popitem(last=False)
+
+
+def _cache_mark_stale(key: tuple[str, ...]) -> None:
+    # Upstream failed: keep serving the last known value, flagged, until it expires.
+    row = _api_cache.get(key)
+    if row is not None and not row[1].get("stale"):
+        _api_cache[key] = (row[0], {**row[1], "stale": True})
+
+
+def _single_flight(key: tuple[str, ...], fetch: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+    # Concurrent callers with the same key share one upstream fetch; shield keeps
+    # the shared task alive if the request that started it is cancelled.
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight_done(key, t))
+    return asyncio.shield(task)
+
+
+def _inflight_done(key: tuple[str, ...], task: asyncio.Future) -> None:
+    _inflight.pop(key, None)
+    if not task.cancelled():
+        # Mark the exception as retrieved even if every waiter went away.
+        task.exception()
+
+
+async def _cached_quote(
+    key: tuple[str, ...],
+    fetch: Callable[[], Awaitable[float | None]],
+    build: Callable[[float | None], dict],
+    label: str,
+) -> dict:
+    # Stale-while-revalidate: young entries are served as is, older ones are served
+    # with "refreshing" while a single background fetch updates them. "stale" is only
+    # set once a fetch has failed and the last known value is being served.
+    cached = _cache_get(key)
+    if cached is not None:
+        data, age = cached
+        if age < _API_CACHE_REFRESH_AFTER_SEC:
+            return data
+        if key not in _inflight:
+            # Register the fetch in _inflight now, not when the task first runs, so a burst
+            # of requests on the same old entry starts only one refresh.
+            task = asyncio.create_task(_refresh_cached_quote(key, _single_flight(key, fetch), build, label))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return {**data, "refreshing": True}
+    try:
+        value = await _single_flight(key, fetch)
+    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
+        logger.warning("MiniApp %s failed key=%s error=%s", label, key, exc.__class__.__name__)
+        value = None
+    payload = build(value)
+    if value is not None:
+        _cache_set(key, payload)
+    return payload
+
+
+async def _refresh_cached_quote(
+    key: tuple[str, ...],
+    refresh: Awaitable[float | None],
+    build: Callable[[float | None], dict],
+    label: str,
+) -> None:
+    try:
+        value = await refresh
+    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
+        logger.warning("MiniApp %s refresh failed key=%s error=%s", label, key, exc.__class__.__name__)
+        _cache_mark_stale(key)
         return
-    to_remove = len(_api_cache) - _API_CACHE_MAX_SIZE
-    oldest_keys = sorted(_api_cache.items(), key=lambda item: item[1][0])[:to_remove]
-    for cache_key, _ in oldest_keys:
-        _api_cache.pop(cache_key, None)
+    if value is not None:
+        _cache_set(key, build(value))
 
 
 async def _read_json(request: web.Request) -> dict:
     try:
-        payload = await request.json()
+        # orjson parses the raw body bytes, skipping the decode to str that request.json() does.
+        payload = orjson.loads(await request.read())
     except (JSONDecodeError, ValueError) as exc:
         raise web.HTTPBadRequest(text="invalid JSON body") from exc
     if not isinstance(payload, dict):
@@ -177,6 +285,12 @@ async def _auth_user_id(request: web.Request, bot_token: str) -> int:
                 return uid
         raise web.HTTPUnauthorized(text="Missing initData")
 
+    # The client resends the same initData on every call; skip re-validating it for a short while.
+    cache_key = (bot_token, hashlib.blake2b(init_data.encode("utf-8"), digest_size=16).digest())
+    cached = _auth_cache.get(cache_key)
+    if cached is not None and time.monotonic() < cached[0]:
+        return cached[1]
+
     try:
         user = parse_and_validate_init_data(
             bot_token,
@@ -189,55 +303,154 @@ async def _auth_user_id(request: web.Request, bot_token: str) -> int:
     user_id = int(user.get("id") or 0)
     if user_id <= 0:
         raise web.HTTPUnauthorized(text="Invalid Telegram user id")
+
+    now = time.monotonic()
+    expires_at = now + _AUTH_CACHE_TTL_SEC
+    auth_date = _AUTH_DATE_RE.search(init_data)
+    if auth_date is not None:
+        # Never serve an entry past the point where initData itself would be rejected as too old.
+        expires_at = min(expires_at, now + int(auth_date.group(1)) + _INITDATA_MAX_AGE_SEC - time.time())
+    _auth_cache[cache_key] = (expires_at, user_id)
+    _auth_cache.move_to_end(cache_key)
+    while len(_auth_cache) > _AUTH_CACHE_MAX_SIZE:
+        _auth_cache.popitem(last=False)
     return user_id
 
 
-async def _load_prices_for_positions(positions: list[dict]) -> dict[int, float | None]:
+@web.middleware
+async def _auth_middleware(request: web.Request, handler):
+    # Authenticate every matched mini app API call once, before the handler runs.
+    match_info = request.match_info
+    if (
+        request.path.startswith("/api/miniapp/")
+        and match_info.http_exception is None
+        and match_info.route.resource is not None
+        and match_info.route.resource.canonical not in _PUBLIC_API_PATHS
+    ):
+        request[REQUEST_USER_ID] = await _auth_user_id(request, request.app[APP_BOT_TOKEN])
+    return await handler(request)
+
+
+async def _load_one_price(session: aiohttp.ClientSession, pos: dict) -> tuple[int, float | None]:
+    iid = int(pos["id"])
+    asset_type = pos.get("asset_type") or ASSET_TYPE_STOCK
+    secid = str(pos.get("secid") or "")
+    boardid = pos.get("boardid")
+    if asset_type == ASSET_TYPE_FIAT:
+        fetch = partial(get_last_price_fiat, session, secid, boardid or "CETS")
+    else:
+        fetch = partial(get_last_price_by_asset_type, session, secid, boardid, asset_type)
+    try:
+        # The MOEX layer caches prices by TTL; this also merges misses that arrive
+        # concurrently from different users' portfolio requests.
+        px = await _single_flight(("last_price", asset_type, secid, boardid or ""), fetch)
+        return iid, px
+    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
+        logger.warning(
+            "MiniApp price load failed secid=%s error=%s",
+            secid,
+            exc.__class__.__name__,
+        )
+        return iid, None
+
+
+async def _load_board_prices(session: aiohttp.ClientSession, boardid: str, secids: list[str]) -> None:
+    # Results land in the MOEX last-price cache; a failure just leaves the
+    # instruments to the per-instrument path.
+    try:
+        await get_last_prices_bulk(session, secids, boardid or None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
+        logger.warning(
+            "MiniApp bulk price load failed board=%s error=%s",
+            boardid,
+            exc.__class__.__name__,
+        )
+
+
+async def _load_prices_for_positions(
+    session: aiohttp.ClientSession,
+    positions: list[dict],
+) -> dict[int, float | None]:
     if not positions:
         return {}
     prices: dict[int, float | None] = {}
-    sem = asyncio.Semaphore(max(1, _PRICE_LOAD_CONCURRENCY))
-    async with aiohttp.ClientSession() as session:
-
-        async def one(pos: dict) -> tuple[int, float | None]:
-            iid = int(pos["id"])
-            asset_type = pos.get("asset_type") or ASSET_TYPE_STOCK
-            secid = str(pos.get("secid") or "")
-            boardid = pos.get("boardid")
-            async with sem:
-                try:
-                    if asset_type == ASSET_TYPE_FIAT:
-                        px = await get_last_price_fiat(session, secid, boardid or "CETS")
-                    else:
-                        px = await get_last_price_by_asset_type(session, secid, boardid, asset_type)
-                    return iid, px
-                except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
-                    logger.warning(
-                        "MiniApp price load failed secid=%s error=%s",
-                        secid,
-                        exc.__class__.__name__,
-                    )
-                    return iid, None
-
-        rows = await asyncio.gather(*(one(p) for p in positions))
-    for iid, px in rows:
-        prices[iid] = px
+    # Fresh cached prices need no upstream call, and positions sharing an instrument
+    # share one lookup, so only unique misses are fanned out.
+    pending: dict[tuple[str, str, str], list[int]] = {}
+    lookups: dict[tuple[str, str, str], dict] = {}
+    for pos in positions:
+        iid = int(pos["id"])
+        asset_type = pos.get("asset_type") or ASSET_TYPE_STOCK
+        secid = str(pos.get("secid") or "")
+        boardid = pos.get("boardid")
+        px = get_cached_last_price(secid, boardid, asset_type)
+        if px is not None:
+            prices[iid] = px
+            continue
+        key = (asset_type, secid, boardid or "")
+        ids = pending.get(key)
+        if ids is None:
+            pending[key] = [iid]
+            lookups[key] = pos
+        else:
+            ids.append(iid)
+    if not lookups:
+        return prices
+
+    # Stock misses on one board are priced by a single bulk request; whatever it
+    # does not cover still goes through the per-instrument path below.
+    boards: dict[str, list[str]] = {}
+    for asset_type, secid, boardid in pending:
+        if asset_type == ASSET_TYPE_STOCK and secid:
+            boards.setdefault(boardid, []).append(secid)
+    bulk = [_load_board_prices(session, boardid, secids) for boardid, secids in boards.items() if len(secids) > 1]
+    if bulk:
+        await asyncio.gather(*bulk)
+        for key in list(lookups):
+            asset_type, secid, boardid = key
+            px = get_cached_last_price(secid, boardid or None, asset_type)
+            if px is not None:
+                for iid in pending.pop(key):
+                    prices[iid] = px
+                del lookups[key]
+        if not lookups:
+            return prices
+
+    rows = await asyncio.gather(*[_load_one_price(session, p) for p in lookups.values()])
+    for ids, (_, px) in zip(pending.values(), rows):
+        for iid in ids:
+            prices[iid] = px
     return prices
 
 
+def _json_dumps(obj: Any) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 def _json_ok(payload: dict | list) -> web.Response:
-    return web.json_response({"ok": True, "data": payload})
+    return web.Response(
+        body=orjson.dumps({"ok": True, "data": payload}, option=orjson.OPT_NON_STR_KEYS),
+        content_type="application/json",
+    )
 
 
 def _json_error(error_code: str, message: str, details: dict | None = None, status: int = 400) -> web.Response:
     return web.json_response(
         {"error_code": error_code, "message": message, "details": details or {}},
         status=status,
+        dumps=_json_dumps,
     )
 
 
+def _normalize_asset_type(raw: Any) -> str:
+    asset_type = str(raw or ASSET_TYPE_STOCK).strip().lower()
+    if asset_type not in _ALLOWED_ASSET_TYPES:
+        raise web.HTTPBadRequest(text="invalid asset_type")
+    return asset_type
+
+
 def _loan_rate_limit(user_id: int, action: str) -> None:
-    now = asyncio.get_running_loop().time()
+    now = time.monotonic()
     key = f"{user_id}:{action}"
     rows = _LOAN_RATE_LIMIT.get(key) or []
     fresh = [x for x in rows if now - x <= _LOAN_RATE_WINDOW_SEC]
@@ -265,24 +478,22 @@ def _parse_money_text(raw: str | int | float | None) -> float:
     if isinstance(raw, (int, float)):
         value = float(raw)
     else:
-        text = str(raw).strip().lower().replace("₽", "")
-        text = text.replace("_", "").replace(" ", "").replace(",", ".")
-        mult = 1.0
-        if text.endswith("млн"):
-            text = text[:-3]
-            mult = 1_000_000.0
-        elif text.endswith("m"):
-            text = text[:-1]
-            mult = 1_000_000.0
-        if text.endswith("м"):
-            text = text[:-1]
-            mult = 1_000_000.0
-        value = float(text) * mult
+        text = str(raw).strip().lower().translate(_MONEY_TEXT_TRANSLATE)
+        # The pattern always matches; group 2 is the optional "million" suffix.
+        number, suffix = _MONEY_TEXT_RE.fullmatch(text).groups()
+        value = float(number) * (1_000_000.0 if suffix else 1.0)
     if value <= 0:
         raise ValueError("amount must be > 0")
     return value
 
 
+def _safe_money(raw: str | int | float | None) -> float | None:
+    try:
+        return _parse_money_text(raw)
+    except ValueError:
+        return None
+
+
 def _parse_month_key(raw: str | None) -> str:
     value = (raw or "").strip()
     if len(value) == 7 and value[4] == "-":
@@ -339,7 +550,7 @@ def _normalize_rate_periods(periods_raw: list[dict], loan_start: date, months: i
         if rate < 0:
             raise ValueError("annual_rate must be >= 0")
         out.append({"start_date": start, "end_date": end, "annual_rate": rate})
-    out.sort(key=lambda x: x["start_date"])
+    out.sort(key=itemgetter("start_date"))
     loan_end = _add_months(loan_start, max(0, months - 1))
     if out[0]["start_date"] > loan_start or out[-1]["end_date"] < loan_end:
         raise ValueError("rate periods must cover the whole loan term")
@@ -410,74 +621,108 @@ def _calc_loan_schedule(
 
 
 async def miniapp_index(request: web.Request) -> web.Response:
-    root = Path(__file__).resolve().parent / "miniapp"
-    return web.FileResponse(root / "index.html")
+    path = request.app[APP_MINIAPP_FILES].get("index.html")
+    if path is None:
+        raise web.HTTPNotFound()
+    # Revalidate on every open: a deploy changes the ?v= asset links inside the page.
+    return web.FileResponse(path, headers={"Cache-Control": "no-cache"})
 
 
 async def miniapp_asset(request: web.Request) -> web.Response:
-    root = Path(__file__).resolve().parent / "miniapp"
     name = (request.match_info.get("name") or "").strip()
-    if "/" in name or ".." in name:
+    # Only files found at startup are served, so traversal attempts simply miss.
+    path = request.app[APP_MINIAPP_FILES].get(name)
+    if path is None:
         raise web.HTTPNotFound()
-    path = root / name
-    if not path.is_file():
-        raise web.HTTPNotFound()
-    return web.FileResponse(path)
+    return web.FileResponse(path, headers={"Cache-Control": _MINIAPP_ASSET_CACHE_CONTROL})
+
+
+async def _http_session_ctx(app: web.Application):
+    # One pooled session per app, so MOEX keep-alive connections survive across requests.
+    # The connector also bounds upstream concurrency for portfolio price fan-out.
+    concurrency = max(1, _PRICE_LOAD_CONCURRENCY)
+    connector = aiohttp.TCPConnector(
+        limit=concurrency * 2,
+        limit_per_host=concurrency,
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+    )
+    async with aiohttp.ClientSession(connector=connector, headers=MOEX_REQUEST_HEADERS) as session:
+        app[APP_HTTP_SESSION] = session
+        yield
+
+
+def _scan_miniapp_files() -> dict[str, Path]:
+    if not _MINIAPP_ROOT.is_dir():
+        return {}
+    return {p.name: p for p in _MINIAPP_ROOT.iterdir() if p.is_file()}
 
 
 async def api_me(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     return _json_ok({"user_id": user_id})
 
 
 async def api_portfolio(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
+    top_raw = (request.query.get("top") or "").strip()
+    try:
+        top = int(top_raw) if top_raw else 0
+    except (TypeError, ValueError) as exc:
+        raise web.HTTPBadRequest(text="invalid top") from exc
     positions = await get_user_positions(db_dsn, user_id)
     if not positions:
         return _json_ok({"summary": {"total_value": 0.0, "pnl_pct": 0.0}, "positions": []})
 
-    prices = await _load_prices_for_positions(positions)
-    out_positions = []
+    prices = await _load_prices_for_positions(request.app[APP_HTTP_SESSION], positions)
+    out_positions: list[dict] = []
     total_value = 0.0
     total_cost = 0.0
     for pos in positions:
+        get = pos.get
         iid = int(pos["id"])
         last = prices.get(iid)
-        qty = float(pos.get("total_qty") or 0.0)
-        total_cost_pos = float(pos.get("total_cost") or 0.0)
-        value = qty * float(last) if last is not None else 0.0
-        pnl_pct = (
-            (value - total_cost_pos) / total_cost_pos * 100.0
-            if total_cost_pos > 1e-12 and last is not None
-            else None
-        )
-        if last is not None:
+        qty = float(get("total_qty") or 0.0)
+        total_cost_pos = float(get("total_cost") or 0.0)
+        if last is None:
+            value = 0.0
+            pnl_pct = None
+        else:
+            value = qty * last
+            pnl_pct = (value - total_cost_pos) / total_cost_pos * 100.0 if total_cost_pos > 1e-12 else None
             total_value += value
             total_cost += total_cost_pos
+        secid = get("secid")
         out_positions.append(
             {
                 "instrument_id": iid,
-                "ticker": str(pos.get("secid") or ""),
-                "name": str(pos.get("shortname") or pos.get("secid") or ""),
-                "asset_type": pos.get("asset_type") or ASSET_TYPE_STOCK,
+                "ticker": str(secid or ""),
+                "name": str(get("shortname") or secid or ""),
+                "asset_type": get("asset_type") or ASSET_TYPE_STOCK,
                 "qty": qty,
                 "last": last,
                 "value": value,
                 "share_pct": 0.0,
                 "ret_30d": pnl_pct,
-                "boardid": pos.get("boardid"),
-                "isin": pos.get("isin"),
+                "boardid": get("boardid"),
+                "isin": get("isin"),
                 "total_cost": total_cost_pos,
             }
         )
 
-    for item in out_positions:
-        if total_value > 0 and item["last"] is not None:
-            item["share_pct"] = item["value"] / total_value * 100.0
+    # share_pct needs the final total, so it is filled in after the main pass.
+    if total_value > 0:
+        scale = 100.0 / total_value
+        for item in out_positions:
+            if item["last"] is not None:
+                item["share_pct"] = item["value"] * scale
 
+    if top > 0:
+        # Totals above cover every position; only the returned list is truncated.
+        out_positions = heapq.nlargest(top, out_positions, key=itemgetter("value"))
+    else:
+        out_positions.sort(key=itemgetter("value"), reverse=True)
     total_pnl_pct = (total_value - total_cost) / total_cost * 100.0 if total_cost > 1e-12 else 0.0
     return _json_ok(
         {
@@ -486,46 +731,41 @@ async def api_portfolio(request: web.Request) -> web.Response:
                 "pnl_pct": total_pnl_pct,
                 "as_of": _utc_now_iso(),
             },
-            "positions": sorted(out_positions, key=lambda x: float(x["value"]), reverse=True),
+            "positions": out_positions,
         }
     )
 
 
 async def api_search(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
-    _ = await _auth_user_id(request, bot_token)
     q = (request.query.get("q") or "").strip()
     asset_type = (request.query.get("asset_type") or ASSET_TYPE_STOCK).strip().lower()
     if not q:
         return _json_ok([])
 
-    async with aiohttp.ClientSession() as session:
-        if asset_type == ASSET_TYPE_METAL:
-            cands = await search_metals(session, q)
-        elif asset_type == ASSET_TYPE_FIAT:
-            cands = await search_fiat(session, q)
-        else:
-            cands = await search_securities(session, q)
+    session = request.app[APP_HTTP_SESSION]
+    if asset_type == ASSET_TYPE_METAL:
+        cands = await search_metals(session, q)
+    elif asset_type == ASSET_TYPE_FIAT:
+        cands = await search_fiat(session, q)
+    else:
+        cands = await search_securities(session, q)
 
     return _json_ok(cands[:30])
 
 
 async def api_trade_post(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     payload = await _read_json(request)
 
     secid = str(payload.get("secid") or "").strip().upper()
     if not secid:
         raise web.HTTPBadRequest(text="secid is required")
 
-    asset_type = str(payload.get("asset_type") or ASSET_TYPE_STOCK).strip().lower()
-    if asset_type not in {ASSET_TYPE_STOCK, ASSET_TYPE_METAL, ASSET_TYPE_FIAT}:
-        raise web.HTTPBadRequest(text="invalid asset_type")
+    asset_type = _normalize_asset_type(payload.get("asset_type"))
 
     side = str(payload.get("side") or TRADE_SIDE_BUY).strip().lower()
-    if side not in {TRADE_SIDE_BUY, TRADE_SIDE_SELL}:
+    if side not in _ALLOWED_SIDES:
         raise web.HTTPBadRequest(text="invalid side")
 
     trade_date = str(payload.get("trade_date") or "").strip()
@@ -574,11 +814,11 @@ async def api_trade_post(request: web.Request) -> web.Response:
     total_qty, total_cost, avg_price = await get_position_agg(db_dsn, user_id, instrument_id)
     last = None
     try:
-        async with aiohttp.ClientSession() as session:
-            if asset_type == ASSET_TYPE_FIAT:
-                last = await get_last_price_fiat(session, secid, boardid)
-            else:
-                last = await get_last_price_by_asset_type(session, secid, boardid, asset_type)
+        session = request.app[APP_HTTP_SESSION]
+        if asset_type == ASSET_TYPE_FIAT:
+            last = await get_last_price_fiat(session, secid, boardid)
+        else:
+            last = await get_last_price_by_asset_type(session, secid, boardid, asset_type)
     except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
         logger.warning("MiniApp trade price load failed secid=%s error=%s", secid, exc.__class__.__name__)
 
@@ -599,62 +839,72 @@ async def api_trade_post(request: web.Request) -> web.Response:
 
 
 async def api_asset_lookup_post(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
-    _ = await _auth_user_id(request, bot_token)
     payload = await _read_json(request)
 
     secid = str(payload.get("secid") or "").strip().upper()
     if not secid:
         raise web.HTTPBadRequest(text="secid is required")
     boardid = str(payload.get("boardid") or "").strip() or None
-    asset_type = str(payload.get("asset_type") or ASSET_TYPE_STOCK).strip().lower()
-    if asset_type not in {ASSET_TYPE_STOCK, ASSET_TYPE_METAL, ASSET_TYPE_FIAT}:
-        raise web.HTTPBadRequest(text="invalid asset_type")
+    asset_type = _normalize_asset_type(payload.get("asset_type"))
 
     now = _today_msk()
     periods = [("week", 7), ("month", 30), ("half_year", 182), ("year", 365)]
 
     current = None
     dynamics: list[dict] = []
-    async with aiohttp.ClientSession() as session:
-        try:
-            if asset_type == ASSET_TYPE_FIAT:
-                current = await get_last_price_fiat(session, secid, boardid or "CETS")
-            else:
-                current = await get_last_price_by_asset_type(session, secid, boardid, asset_type)
-        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
-            logger.warning("MiniApp asset lookup price failed secid=%s error=%s", secid, exc.__class__.__name__)
-
-        for key, days in periods:
-            try:
-                history = await get_history_prices_by_asset_type(
-                    session,
-                    secid=secid,
-                    boardid=boardid,
-                    asset_type=asset_type,
-                    from_date=now - timedelta(days=days),
-                    till_date=now,
-                )
-            except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
-                logger.warning(
-                    "MiniApp asset lookup history failed secid=%s period=%s error=%s",
-                    secid,
-                    key,
-                    exc.__class__.__name__,
-                )
-                dynamics.append({"period": key, "pct": None, "delta": None})
-                continue
-            if not history:
-                dynamics.append({"period": key, "pct": None, "delta": None})
-                continue
-            base = safe_float(history[0][1], 0.0)
-            end = safe_float(current, 0.0) if current is not None else safe_float(history[-1][1], 0.0)
-            if base <= 0:
-                dynamics.append({"period": key, "pct": None, "delta": None})
-                continue
-            delta = end - base
-            pct = delta / base * 100.0
-            dynamics.append({"period": key, "pct": pct, "delta": delta})
+    session = request.app[APP_HTTP_SESSION]
+    if asset_type == ASSET_TYPE_FIAT:
+        current_coro = get_last_price_fiat(session, secid, boardid or "CETS")
+    else:
+        current_coro = get_last_price_by_asset_type(session, secid, boardid, asset_type)
+    # Current price and every history period are independent upstream calls, so fetch them concurrently.
+    current_res, *history_results = await asyncio.gather(
+        current_coro,
+        *(
+            get_history_prices_by_asset_type(
+                session,
+                secid=secid,
+                boardid=boardid,
+                asset_type=asset_type,
+                from_date=now - timedelta(days=days),
+                till_date=now,
+            )
+            for _, days in periods
+        ),
+        return_exceptions=True,
+    )
+
+    upstream_errors = (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError)
+    if isinstance(current_res, upstream_errors):
+        logger.warning("MiniApp asset lookup price failed secid=%s error=%s", secid, current_res.__class__.__name__)
+    elif isinstance(current_res, BaseException):
+        raise current_res
+    else:
+        current = current_res
+
+    for (key, _), history in zip(periods, history_results):
+        if isinstance(history, upstream_errors):
+            logger.warning(
+                "MiniApp asset lookup history failed secid=%s period=%s error=%s",
+                secid,
+                key,
+                history.__class__.__name__,
+            )
+            dynamics.append({"period": key, "pct": None, "delta": None})
+            continue
+        if isinstance(history, BaseException):
+            raise history
+        if not history:
+            dynamics.append({"period": key, "pct": None, "delta": None})
+            continue
+        base = safe_float(history[0][1], 0.0)
+        end = safe_float(current, 0.0) if current is not None else safe_float(history[-1][1], 0.0)
+        if base <= 0:
+            dynamics.append({"period": key, "pct": None, "delta": None})
+            continue
+        delta = end - base
+        pct = delta / base * 100.0
+        dynamics.append({"period": key, "pct": pct, "delta": delta})
 
     return _json_ok(
         {
@@ -669,8 +919,6 @@ async def api_asset_lookup_post(request: web.Request) -> web.Response:
 
 
 async def api_top_movers(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
-    _ = await _auth_user_id(request, bot_token)
 
     day_str = (request.query.get("date") or "").strip()
     if day_str:
@@ -682,83 +930,71 @@ async def api_top_movers(request: web.Request) -> web.Response:
         day = _today_msk()
 
     try:
-        async with aiohttp.ClientSession() as session:
-            movers = await get_stock_movers_by_date(session, day)
+        session = request.app[APP_HTTP_SESSION]
+        movers = await get_stock_movers_by_date(session, day)
     except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
         logger.warning("MiniApp top movers failed date=%s error=%s", day.isoformat(), exc.__class__.__name__)
         movers = []
 
-    movers_sorted = sorted(movers, key=lambda x: safe_float(x.get("pct"), -10**9), reverse=True)
-    top = movers_sorted[:10]
-    bottom = list(reversed(movers_sorted[-10:])) if movers_sorted else []
-    return _json_ok({"date": day.isoformat(), "top": top, "bottom": bottom, "count": len(movers_sorted)})
+    def pct_key(x: dict) -> float:
+        return safe_float(x.get("pct"), -10**9)
+
+    top = heapq.nlargest(10, movers, key=pct_key)
+    bottom = heapq.nsmallest(10, movers, key=pct_key)
+    return _json_ok({"date": day.isoformat(), "top": top, "bottom": bottom, "count": len(movers)})
 
 
 async def api_usd_rub(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
-    _ = await _auth_user_id(request, bot_token)
-    try:
-        async with aiohttp.ClientSession() as session:
-            rate = await get_usd_rub_rate(session)
-    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
-        logger.warning("MiniApp USD/RUB failed error=%s", exc.__class__.__name__)
-        cached = _cache_get("usd_rub")
-        if cached is not None:
-            return _json_ok({**cached, "stale": True})
-        rate = None
-    payload = {"secid": "USDRUB_TOM", "rate": rate, "as_of": _utc_now_iso()}
-    if rate is not None:
-        _cache_set("usd_rub", payload)
+    session = request.app[APP_HTTP_SESSION]
+    payload = await _cached_quote(
+        _USD_RUB_CACHE_KEY,
+        lambda: get_usd_rub_rate(session),
+        lambda rate: {"secid": "USDRUB_TOM", "rate": rate, "as_of": _utc_now_iso()},
+        "USD/RUB",
+    )
     return _json_ok(payload)
 
 
 async def api_price(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
-    _ = await _auth_user_id(request, bot_token)
     payload = await _read_json(request)
     secid = str(payload.get("secid") or "").strip().upper()
     if not secid:
         raise web.HTTPBadRequest(text="secid is required")
     boardid = str(payload.get("boardid") or "").strip() or None
-    asset_type = str(payload.get("asset_type") or ASSET_TYPE_STOCK).strip().lower()
-    if asset_type not in {ASSET_TYPE_STOCK, ASSET_TYPE_METAL, ASSET_TYPE_FIAT}:
-        raise web.HTTPBadRequest(text="invalid asset_type")
-    try:
-        async with aiohttp.ClientSession() as session:
-            if asset_type == ASSET_TYPE_FIAT:
-                # Fast preview for Mini App: do not block on ISS fallback timeouts.
-                price = await get_last_price_fiat(
-                    session,
-                    secid,
-                    boardid or "CETS",
-                    allow_iss_fallback=False,
-                )
-            else:
-                price = await get_last_price_by_asset_type(session, secid, boardid, asset_type)
-    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
-        logger.warning("MiniApp price endpoint failed secid=%s error=%s", secid, exc.__class__.__name__)
-        cached = _cache_get(f"price:{asset_type}:{secid}:{boardid or ''}")
-        if cached is not None:
-            return _json_ok({**cached, "stale": True})
-        price = None
-    payload = {"secid": secid, "price": price, "as_of": _utc_now_iso()}
-    if price is not None:
-        _cache_set(f"price:{asset_type}:{secid}:{boardid or ''}", payload)
+    asset_type = _normalize_asset_type(payload.get("asset_type"))
+    cache_key = ("price", asset_type, secid, boardid or "")
+    session = request.app[APP_HTTP_SESSION]
+
+    async def fetch_price() -> float | None:
+        if asset_type == ASSET_TYPE_FIAT:
+            # Fast preview for Mini App: do not block on ISS fallback timeouts.
+            return await get_last_price_fiat(
+                session,
+                secid,
+                boardid or "CETS",
+                allow_iss_fallback=False,
+            )
+        return await get_last_price_by_asset_type(session, secid, boardid, asset_type)
+
+    payload = await _cached_quote(
+        cache_key,
+        fetch_price,
+        lambda price: {"secid": secid, "price": price, "as_of": _utc_now_iso()},
+        "price endpoint",
+    )
     return _json_ok(payload)
 
 
 async def api_portfolio_clear(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     deleted = await clear_user_portfolio(db_dsn, user_id)
     return _json_ok({"deleted_trades": deleted})
 
 
 async def api_open_close_settings(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
 
     if request.method == "GET":
         await ensure_user_alert_settings(db_dsn, user_id)
@@ -772,17 +1008,13 @@ async def api_open_close_settings(request: web.Request) -> web.Response:
 
 
 async def api_articles_list(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    _ = await _auth_user_id(request, bot_token)
     items = await list_active_app_texts(db_dsn)
     return _json_ok(items)
 
 
 async def api_article_item(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    _ = await _auth_user_id(request, bot_token)
     text_code = str(request.match_info.get("text_code") or "").strip()
     if not text_code:
         raise web.HTTPBadRequest(text="text_code is required")
@@ -793,9 +1025,16 @@ async def api_article_item(request: web.Request) -> web.Response:
 
 
 async def api_import_xml(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
+
+    # Reject obvious overflows before reading the body; the chunk loop below still guards chunked uploads.
+    content_length = request.content_length
+    if content_length is not None and content_length > MAX_XML_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES:
+        raise web.HTTPRequestEntityTooLarge(
+            max_size=MAX_XML_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES,
+            actual_size=content_length,
+        )
 
     reader = await request.multipart()
     part = await reader.next()
@@ -806,17 +1045,14 @@ async def api_import_xml(request: web.Request) -> web.Response:
     if not filename.lower().endswith(".xml"):
         raise web.HTTPBadRequest(text="only .xml is supported")
 
-    chunks = []
-    size = 0
+    xml_bytes = bytearray()
     while True:
         chunk = await part.read_chunk(256 * 1024)
         if not chunk:
             break
-        size += len(chunk)
-        if size > MAX_XML_UPLOAD_BYTES:
+        xml_bytes.extend(chunk)
+        if len(xml_bytes) > MAX_XML_UPLOAD_BYTES:
             raise web.HTTPBadRequest(text="file is too large")
-        chunks.append(chunk)
-    xml_bytes = b"".join(chunks)
 
     try:
         result = await import_broker_xml_trades(
@@ -824,6 +1060,7 @@ async def api_import_xml(request: web.Request) -> web.Response:
             user_id=user_id,
             file_name=filename,
             xml_bytes=xml_bytes,
+            session=request.app[APP_HTTP_SESSION],
         )
     except ValueError as exc:
         raise web.HTTPBadRequest(text=str(exc)) from exc
@@ -841,17 +1078,15 @@ async def api_import_xml(request: web.Request) -> web.Response:
 
 
 async def api_alerts_get(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     alerts = await list_active_price_target_alerts(db_dsn, user_id)
     return _json_ok(alerts)
 
 
 async def api_alerts_post(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     payload = await _read_json(request)
 
     secid = str(payload.get("secid") or "").strip()
@@ -860,9 +1095,7 @@ async def api_alerts_post(request: web.Request) -> web.Response:
     shortname = str(payload.get("shortname") or secid).strip()
     isin = str(payload.get("isin") or "").strip() or None
     boardid = str(payload.get("boardid") or "").strip() or None
-    asset_type = str(payload.get("asset_type") or ASSET_TYPE_STOCK).strip().lower()
-    if asset_type not in {ASSET_TYPE_STOCK, ASSET_TYPE_METAL, ASSET_TYPE_FIAT}:
-        raise web.HTTPBadRequest(text="invalid asset_type")
+    asset_type = _normalize_asset_type(payload.get("asset_type"))
     if asset_type == ASSET_TYPE_FIAT and not boardid:
         boardid = "CETS"
 
@@ -903,9 +1136,8 @@ async def api_alerts_post(request: web.Request) -> web.Response:
 
 
 async def api_alerts_delete(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         alert_id = int(request.match_info["alert_id"])
     except (TypeError, ValueError) as exc:
@@ -915,9 +1147,8 @@ async def api_alerts_delete(request: web.Request) -> web.Response:
 
 
 async def api_mode(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         mode = await get_user_last_mode(db_dsn, user_id)
         return _json_ok({"last_mode": mode})
@@ -930,17 +1161,15 @@ async def api_mode(request: web.Request) -> web.Response:
 
 
 async def api_budget_dashboard(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     data = await get_budget_dashboard(db_dsn, user_id)
     return _json_ok(data)
 
 
 async def api_budget_profile(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         return _json_ok(await get_budget_profile(db_dsn, user_id))
     payload = await _read_json(request)
@@ -1006,9 +1235,8 @@ async def api_budget_profile(request: web.Request) -> web.Response:
 
 
 async def api_budget_obligations(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         rows = await list_budget_obligations(db_dsn, user_id)
         total = sum(float(x.get("amount_monthly") or 0.0) for x in rows)
@@ -1045,12 +1273,10 @@ async def api_budget_obligations(request: web.Request) -> web.Response:
 
 
 async def api_budget_savings(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
-        rows = await list_budget_savings(db_dsn, user_id)
-        total = sum(float(x.get("amount") or 0.0) for x in rows)
+        rows, total = await list_budget_savings_with_total(db_dsn, user_id)
         return _json_ok({"items": rows, "total": total})
     payload = await _read_json(request)
     kind = str(payload.get("kind") or "other").strip().lower()
@@ -1072,9 +1298,8 @@ async def api_budget_savings(request: web.Request) -> web.Response:
 
 
 async def api_budget_saving_item(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         saving_id = int(request.match_info["saving_id"])
     except (TypeError, ValueError) as exc:
@@ -1138,12 +1363,10 @@ async def api_budget_saving_item(request: web.Request) -> web.Response:
 
 
 async def api_budget_incomes(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
-        rows = await list_budget_incomes(db_dsn, user_id)
-        total = sum(float(x.get("amount_monthly") or 0.0) for x in rows)
+        rows, total = await list_budget_incomes_with_total(db_dsn, user_id)
         return _json_ok({"items": rows, "total": total})
     payload = await _read_json(request)
     kind = str(payload.get("kind") or "other").strip().lower()
@@ -1167,9 +1390,8 @@ async def api_budget_incomes(request: web.Request) -> web.Response:
 
 
 async def api_budget_income_item(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         income_id = int(request.match_info["income_id"])
     except (TypeError, ValueError) as exc:
@@ -1286,9 +1508,8 @@ def _build_expense_payload(payload: dict) -> tuple[str, str, float, dict]:
 
 
 async def api_budget_expenses(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         rows = await list_budget_expenses(db_dsn, user_id)
         total = sum(float(x.get("amount_monthly") or 0.0) for x in rows)
@@ -1315,9 +1536,8 @@ async def api_budget_expenses(request: web.Request) -> web.Response:
 
 
 async def api_budget_expense_item(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         expense_id = int(request.match_info["expense_id"])
     except (TypeError, ValueError) as exc:
@@ -1361,9 +1581,8 @@ async def api_budget_expense_item(request: web.Request) -> web.Response:
 
 
 async def api_budget_reset(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     result = await reset_budget_data(db_dsn, user_id)
     await add_budget_history_event(
         db_dsn,
@@ -1376,9 +1595,8 @@ async def api_budget_reset(request: web.Request) -> web.Response:
 
 
 async def api_budget_notification_settings(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         return _json_ok(await get_budget_notification_settings(db_dsn, user_id))
     payload = await _read_json(request)
@@ -1408,8 +1626,10 @@ def _calc_fund_strategy(
     expenses_base: float,
 ) -> dict:
     now = _today_msk()
-    target_dt = datetime.strptime(target_month + "-01", "%Y-%m-%d").date()
-    months_left = max(1, (target_dt.year - now.year) * 12 + (target_dt.month - now.month))
+    # target_month is already normalized to YYYY-MM by the caller.
+    target_year = int(target_month[:4])
+    target_mon = int(target_month[5:7])
+    months_left = max(1, (target_year - now.year) * 12 + (target_mon - now.month))
     need = max(0.0, target_amount - already_saved)
     required_per_month = need / months_left if need > 0 else 0.0
     free = income - obligations_total - expenses_base
@@ -1443,9 +1663,8 @@ def _normalize_goal_checklist(raw: object) -> list[dict]:
 
 
 async def api_budget_fund_strategy(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     payload = await _read_json(request)
     title = str(payload.get("title") or "").strip()
     if not title:
@@ -1497,9 +1716,8 @@ async def api_budget_fund_strategy(request: web.Request) -> web.Response:
 
 
 async def api_budget_funds(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         return _json_ok(await list_budget_funds(db_dsn, user_id))
     payload = await _read_json(request)
@@ -1562,9 +1780,8 @@ async def api_budget_funds(request: web.Request) -> web.Response:
 
 
 async def api_budget_fund_item(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         fund_id = int(request.match_info["fund_id"])
     except (TypeError, ValueError) as exc:
@@ -1579,26 +1796,18 @@ async def api_budget_fund_item(request: web.Request) -> web.Response:
             amount = _parse_money_text(payload.get("amount"))
         except ValueError as exc:
             raise web.HTTPBadRequest(text="invalid amount") from exc
-        rows = await list_budget_funds(db_dsn, user_id)
-        fund = next((x for x in rows if int(x["id"]) == fund_id), None)
-        if not fund:
+        new_total = await increment_budget_fund_saved(db_dsn, user_id, fund_id, amount)
+        if new_total is None:
             raise web.HTTPNotFound(text="fund not found")
-        ok = await update_budget_fund(
+        await add_budget_history_event(
             db_dsn,
             user_id=user_id,
-            fund_id=fund_id,
-            already_saved=float(fund["already_saved"]) + amount,
+            entity="goal",
+            entity_id=fund_id,
+            action="topup",
+            payload={"amount": amount},
         )
-        if ok:
-            await add_budget_history_event(
-                db_dsn,
-                user_id=user_id,
-                entity="goal",
-                entity_id=fund_id,
-                action="topup",
-                payload={"amount": amount},
-            )
-        return _json_ok({"updated": ok})
+        return _json_ok({"updated": True})
 
     if action == "edit":
         kwargs = {}
@@ -1675,9 +1884,8 @@ async def api_budget_fund_item(request: web.Request) -> web.Response:
 
 
 async def api_budget_month_close(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     payload = await _read_json(request)
 
     month_raw = payload.get("month_key") or (_today_msk().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
@@ -1699,18 +1907,16 @@ async def api_budget_month_close(request: web.Request) -> web.Response:
     extra_income_items = payload.get("extra_income_items") or []
     if not isinstance(extra_income_items, list):
         raise web.HTTPBadRequest(text="extra_income_items must be list")
-    clean_items = []
-    for item in extra_income_items:
-        if not isinstance(item, dict):
-            continue
-        label = str(item.get("type") or "Другое").strip() or "Другое"
-        amount_raw = item.get("amount")
-        try:
-            amount = _parse_money_text(amount_raw)
-        except ValueError:
-            continue
-        comment = str(item.get("comment") or "").strip()
-        clean_items.append({"type": label, "amount": amount, "comment": comment})
+    # Malformed items are dropped silently, as before.
+    clean_items = [
+        {
+            "type": str(item.get("type") or "Другое").strip() or "Другое",
+            "amount": amount,
+            "comment": str(item.get("comment") or "").strip(),
+        }
+        for item in extra_income_items
+        if isinstance(item, dict) and (amount := _safe_money(item.get("amount"))) is not None
+    ]
 
     result = await close_budget_month(
         db_dsn,
@@ -1731,9 +1937,8 @@ async def api_budget_month_close(request: web.Request) -> web.Response:
 
 
 async def api_budget_history(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     limit_raw = (request.query.get("limit") or "").strip()
     try:
         limit = int(limit_raw) if limit_raw else 100
@@ -1780,7 +1985,7 @@ def _normalize_loan_rate_periods(periods_raw: Any, first_payment_date: date, ter
             raise ValueError("rate period end_date before start_date")
         rate = _parse_decimal(row.get("annual_rate"), field="annual_rate", min_value=Decimal("0"), max_value=Decimal("100"))
         out.append({"start_date": start, "end_date": end, "annual_rate": rate})
-    out.sort(key=lambda x: x["start_date"])
+    out.sort(key=itemgetter("start_date"))
 
     # Continuous non-overlapping periods improve predictability for the user.
     if out[0]["start_date"] > first_payment_date:
@@ -1883,9 +2088,8 @@ async def _compute_loan_cached(
 
 
 async def api_loans(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         items = await list_loan_accounts(db_dsn, user_id)
         return _json_ok({"items": items})
@@ -1953,13 +2157,12 @@ async def api_loans(request: web.Request) -> web.Response:
             },
             client_request_id=f"loan-create-rate-{loan_id}-{idx}",
         )
-    return web.json_response({"loan_id": loan_id, "status": "ACTIVE"}, status=201)
+    return web.json_response({"loan_id": loan_id, "status": "ACTIVE"}, status=201, dumps=_json_dumps)
 
 
 async def api_loan_item(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -1977,9 +2180,8 @@ async def api_loan_item(request: web.Request) -> web.Response:
 
 
 async def api_loan_schedule(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2011,9 +2213,8 @@ async def api_loan_schedule(request: web.Request) -> web.Response:
 
 
 async def api_loan_events_extra(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         _loan_rate_limit(user_id, "loan_event")
         loan_id = int(request.match_info["loan_id"])
@@ -2058,9 +2259,8 @@ async def api_loan_events_extra(request: web.Request) -> web.Response:
 
 
 async def api_loan_events_rate(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         _loan_rate_limit(user_id, "loan_event")
         loan_id = int(request.match_info["loan_id"])
@@ -2091,9 +2291,8 @@ async def api_loan_events_rate(request: web.Request) -> web.Response:
 
 
 async def api_loan_events_holiday(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         _loan_rate_limit(user_id, "loan_event")
         loan_id = int(request.match_info["loan_id"])
@@ -2133,9 +2332,8 @@ async def api_loan_events_holiday(request: web.Request) -> web.Response:
 
 
 async def api_loan_scenario_preview(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         _loan_rate_limit(user_id, "loan_preview")
         loan_id = int(request.match_info["loan_id"])
@@ -2209,9 +2407,8 @@ async def api_loan_scenario_preview(request: web.Request) -> web.Response:
 
 
 async def api_loan_tips(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2307,9 +2504,8 @@ def _render_simple_pdf(title: str, lines: list[str]) -> bytes:
 
 
 async def api_loan_actual_payments(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2349,9 +2545,8 @@ async def api_loan_actual_payments(request: web.Request) -> web.Response:
 
 
 async def api_loan_refinance_preview(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2391,9 +2586,8 @@ async def api_loan_refinance_preview(request: web.Request) -> web.Response:
 
 
 async def api_loan_optimizer(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2431,9 +2625,8 @@ async def api_loan_optimizer(request: web.Request) -> web.Response:
 
 
 async def api_loan_export(request: web.Request) -> web.StreamResponse:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2468,9 +2661,8 @@ async def api_loan_export(request: web.Request) -> web.StreamResponse:
 
 async def api_loan_share_create(request: web.Request) -> web.Response:
     import secrets
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     try:
         loan_id = int(request.match_info["loan_id"])
     except (TypeError, ValueError):
@@ -2515,9 +2707,8 @@ async def api_loan_share_get(request: web.Request) -> web.Response:
 
 
 async def api_loan_reminders(request: web.Request) -> web.Response:
-    bot_token = request.app[APP_BOT_TOKEN]
     db_dsn = request.app[APP_DB_DSN]
-    user_id = await _auth_user_id(request, bot_token)
+    user_id = request[REQUEST_USER_ID]
     if request.method == "GET":
         return _json_ok(await get_loan_reminder_settings(db_dsn, user_id))
     payload = await _read_json(request)
@@ -2530,74 +2721,83 @@ async def api_loan_reminders(request: web.Request) -> web.Response:
     return _json_ok(updated)
 
 
+# Registered as one batch; same-path GET/POST pairs stay adjacent so they share a resource.
+_ROUTES = (
+    web.get("/miniapp", miniapp_index),
+    web.get("/miniapp/{name}", miniapp_asset),
+
+    web.get("/api/miniapp/me", api_me),
+    web.get("/api/miniapp/portfolio", api_portfolio),
+    web.get("/api/miniapp/search", api_search),
+    web.post("/api/miniapp/trades", api_trade_post),
+    web.post("/api/miniapp/asset_lookup", api_asset_lookup_post),
+    web.get("/api/miniapp/top_movers", api_top_movers),
+    web.get("/api/miniapp/usd_rub", api_usd_rub),
+    web.post("/api/miniapp/price", api_price),
+    web.post("/api/miniapp/portfolio/clear", api_portfolio_clear),
+    web.get("/api/miniapp/settings/open_close", api_open_close_settings),
+    web.post("/api/miniapp/settings/open_close", api_open_close_settings),
+    web.get("/api/miniapp/articles", api_articles_list),
+    web.get("/api/miniapp/articles/{text_code}", api_article_item),
+    web.post("/api/miniapp/import/xml", api_import_xml),
+
+    web.get("/api/miniapp/alerts", api_alerts_get),
+    web.post("/api/miniapp/alerts", api_alerts_post),
+    web.delete("/api/miniapp/alerts/{alert_id}", api_alerts_delete),
+
+    web.get("/api/miniapp/mode", api_mode),
+    web.post("/api/miniapp/mode", api_mode),
+    web.get("/api/miniapp/budget/dashboard", api_budget_dashboard),
+    web.get("/api/miniapp/budget/profile", api_budget_profile),
+    web.post("/api/miniapp/budget/profile", api_budget_profile),
+    web.get("/api/miniapp/budget/obligations", api_budget_obligations),
+    web.post("/api/miniapp/budget/obligations", api_budget_obligations),
+    web.get("/api/miniapp/budget/savings", api_budget_savings),
+    web.post("/api/miniapp/budget/savings", api_budget_savings),
+    web.post("/api/miniapp/budget/savings/{saving_id}", api_budget_saving_item),
+    web.get("/api/miniapp/budget/incomes", api_budget_incomes),
+    web.post("/api/miniapp/budget/incomes", api_budget_incomes),
+    web.post("/api/miniapp/budget/incomes/{income_id}", api_budget_income_item),
+    web.get("/api/miniapp/budget/expenses", api_budget_expenses),
+    web.post("/api/miniapp/budget/expenses", api_budget_expenses),
+    web.post("/api/miniapp/budget/expenses/{expense_id}", api_budget_expense_item),
+    web.post("/api/miniapp/budget/reset", api_budget_reset),
+    web.get("/api/miniapp/budget/settings/notifications", api_budget_notification_settings),
+    web.post("/api/miniapp/budget/settings/notifications", api_budget_notification_settings),
+    web.post("/api/miniapp/budget/funds/strategy", api_budget_fund_strategy),
+    web.get("/api/miniapp/budget/funds", api_budget_funds),
+    web.post("/api/miniapp/budget/funds", api_budget_funds),
+    web.post("/api/miniapp/budget/funds/{fund_id}", api_budget_fund_item),
+    web.post("/api/miniapp/budget/month-close", api_budget_month_close),
+    web.get("/api/miniapp/budget/history", api_budget_history),
+
+    web.get("/api/miniapp/loans", api_loans),
+    web.post("/api/miniapp/loans", api_loans),
+    web.get("/api/miniapp/loans/{loan_id}", api_loan_item),
+    web.delete("/api/miniapp/loans/{loan_id}", api_loan_item),
+    web.get("/api/miniapp/loans/{loan_id}/schedule", api_loan_schedule),
+    web.post("/api/miniapp/loans/{loan_id}/events/extra-payment", api_loan_events_extra),
+    web.post("/api/miniapp/loans/{loan_id}/events/rate-change", api_loan_events_rate),
+    web.post("/api/miniapp/loans/{loan_id}/events/holiday", api_loan_events_holiday),
+    web.get("/api/miniapp/loans/{loan_id}/actual-payments", api_loan_actual_payments),
+    web.post("/api/miniapp/loans/{loan_id}/actual-payments", api_loan_actual_payments),
+    web.post("/api/miniapp/loans/{loan_id}/scenarios/preview", api_loan_scenario_preview),
+    web.post("/api/miniapp/loans/{loan_id}/refinance/preview", api_loan_refinance_preview),
+    web.post("/api/miniapp/loans/{loan_id}/optimize", api_loan_optimizer),
+    web.get("/api/miniapp/loans/{loan_id}/export", api_loan_export),
+    web.post("/api/miniapp/loans/{loan_id}/share", api_loan_share_create),
+    web.get("/api/miniapp/loans/{loan_id}/tips", api_loan_tips),
+    web.get("/api/miniapp/loans/share/{token}", api_loan_share_get),
+    web.get("/api/miniapp/loan-reminders/settings", api_loan_reminders),
+    web.post("/api/miniapp/loan-reminders/settings", api_loan_reminders),
+)
+
+
 def attach_miniapp_routes(app: web.Application, db_dsn: str, bot_token: str) -> None:
     app[APP_DB_DSN] = db_dsn
     app[APP_BOT_TOKEN] = bot_token
+    app[APP_MINIAPP_FILES] = _scan_miniapp_files()
+    app.cleanup_ctx.append(_http_session_ctx)
+    app.middlewares.append(_auth_middleware)
 
-    app.router.add_get("/miniapp", miniapp_index)
-    app.router.add_get("/miniapp/{name}", miniapp_asset)
-
-    app.router.add_get("/api/miniapp/me", api_me)
-    app.router.add_get("/api/miniapp/portfolio", api_portfolio)
-    app.router.add_get("/api/miniapp/search", api_search)
-    app.router.add_post("/api/miniapp/trades", api_trade_post)
-    app.router.add_post("/api/miniapp/asset_lookup", api_asset_lookup_post)
-    app.router.add_get("/api/miniapp/top_movers", api_top_movers)
-    app.router.add_get("/api/miniapp/usd_rub", api_usd_rub)
-    app.router.add_post("/api/miniapp/price", api_price)
-    app.router.add_post("/api/miniapp/portfolio/clear", api_portfolio_clear)
-    app.router.add_get("/api/miniapp/settings/open_close", api_open_close_settings)
-    app.router.add_post("/api/miniapp/settings/open_close", api_open_close_settings)
-    app.router.add_get("/api/miniapp/articles", api_articles_list)
-    app.router.add_get("/api/miniapp/articles/{text_code}", api_article_item)
-    app.router.add_post("/api/miniapp/import/xml", api_import_xml)
-
-    app.router.add_get("/api/miniapp/alerts", api_alerts_get)
-    app.router.add_post("/api/miniapp/alerts", api_alerts_post)
-    app.router.add_delete("/api/miniapp/alerts/{alert_id}", api_alerts_delete)
-
-    app.router.add_get("/api/miniapp/mode", api_mode)
-    app.router.add_post("/api/miniapp/mode", api_mode)
-    app.router.add_get("/api/miniapp/budget/dashboard", api_budget_dashboard)
-    app.router.add_get("/api/miniapp/budget/profile", api_budget_profile)
-    app.router.add_post("/api/miniapp/budget/profile", api_budget_profile)
-    app.router.add_get("/api/miniapp/budget/obligations", api_budget_obligations)
-    app.router.add_post("/api/miniapp/budget/obligations", api_budget_obligations)
-    app.router.add_get("/api/miniapp/budget/savings", api_budget_savings)
-    app.router.add_post("/api/miniapp/budget/savings", api_budget_savings)
-    app.router.add_post("/api/miniapp/budget/savings/{saving_id}", api_budget_saving_item)
-    app.router.add_get("/api/miniapp/budget/incomes", api_budget_incomes)
-    app.router.add_post("/api/miniapp/budget/incomes", api_budget_incomes)
-    app.router.add_post("/api/miniapp/budget/incomes/{income_id}", api_budget_income_item)
-    app.router.add_get("/api/miniapp/budget/expenses", api_budget_expenses)
-    app.router.add_post("/api/miniapp/budget/expenses", api_budget_expenses)
-    app.router.add_post("/api/miniapp/budget/expenses/{expense_id}", api_budget_expense_item)
-    app.router.add_post("/api/miniapp/budget/reset", api_budget_reset)
-    app.router.add_get("/api/miniapp/budget/settings/notifications", api_budget_notification_settings)
-    app.router.add_post("/api/miniapp/budget/settings/notifications", api_budget_notification_settings)
-    app.router.add_post("/api/miniapp/budget/funds/strategy", api_budget_fund_strategy)
-    app.router.add_get("/api/miniapp/budget/funds", api_budget_funds)
-    app.router.add_post("/api/miniapp/budget/funds", api_budget_funds)
-    app.router.add_post("/api/miniapp/budget/funds/{fund_id}", api_budget_fund_item)
-    app.router.add_post("/api/miniapp/budget/month-close", api_budget_month_close)
-    app.router.add_get("/api/miniapp/budget/history", api_budget_history)
-
-    app.router.add_get("/api/miniapp/loans", api_loans)
-    app.router.add_post("/api/miniapp/loans", api_loans)
-    app.router.add_get("/api/miniapp/loans/{loan_id}", api_loan_item)
-    app.router.add_delete("/api/miniapp/loans/{loan_id}", api_loan_item)
-    app.router.add_get("/api/miniapp/loans/{loan_id}/schedule", api_loan_schedule)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/events/extra-payment", api_loan_events_extra)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/events/rate-change", api_loan_events_rate)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/events/holiday", api_loan_events_holiday)
-    app.router.add_get("/api/miniapp/loans/{loan_id}/actual-payments", api_loan_actual_payments)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/actual-payments", api_loan_actual_payments)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/scenarios/preview", api_loan_scenario_preview)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/refinance/preview", api_loan_refinance_preview)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/optimize", api_loan_optimizer)
-    app.router.add_get("/api/miniapp/loans/{loan_id}/export", api_loan_export)
-    app.router.add_post("/api/miniapp/loans/{loan_id}/share", api_loan_share_create)
-    app.router.add_get("/api/miniapp/loans/{loan_id}/tips", api_loan_tips)
-    app.router.add_get("/api/miniapp/loans/share/{token}", api_loan_share_get)
-    app.router.add_get("/api/miniapp/loan-reminders/settings", api_loan_reminders)
-    app.router.add_post("/api/miniapp/loan-reminders/settings", api_loan_reminders)
+    app.add_routes(_ROUTES)
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 import hashlib
 import hmac
-import json
 import time
-from urllib.parse import parse_qsl
+from functools import lru_cache
+from urllib.parse import unquote_plus
+
+import orjson
 
 
 class MiniAppAuthError(Exception):
@@ -12,15 +14,57 @@ class MiniAppAuthError(Exception):
 
 
 def _parse_init_data(init_data: str) -> dict[str, str]:
-    pairs = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=False))
-    return {str(k): str(v) for k, v in pairs.items()}
+    # Same result as dict(parse_qsl(..., keep_blank_values=True)), but only values
+    # that actually contain escapes (in practice just "user") get decoded.
+    out: dict[str, str] = {}
+    for part in init_data.split("&"):
+        if not part:
+            continue
+        key, _, value = part.partition("=")
+        if "%" in key or "+" in key:
+            key = unquote_plus(key)
+        if "%" in value or "+" in value:
+            value = unquote_plus(value)
+        out[key] = value
+    return out
 
 
-def _calc_webapp_hash(bot_token: str, fields: dict[str, str]) -> str:
-    data_check_arr = [f"{k}={v}" for k, v in sorted(fields.items()) if k != "hash"]
-    data_check_string = "\n".join(data_check_arr)
+@lru_cache(maxsize=8)
+def _webapp_hmac(bot_token: str) -> hmac.HMAC:
+    # Depends only on the bot token: derive the secret and key the HMAC once,
+    # then each request starts from a copy of the already-padded state.
     secret_key = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
-    return hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    return hmac.new(secret_key, digestmod=hashlib.sha256)
+
+
+# Documented initData keys in lexicographic order, "hash" included so that any
+# payload made only of known keys can skip the per-request sort.
+_INIT_DATA_KEY_ORDER = (
+    "auth_date",
+    "can_send_after",
+    "chat",
+    "chat_instance",
+    "chat_type",
+    "hash",
+    "query_id",
+    "receiver",
+    "signature",
+    "start_param",
+    "user",
+)
+_INIT_DATA_KEYS = frozenset(_INIT_DATA_KEY_ORDER)
+
+
+def _calc_webapp_hash(bot_token: str, fields: dict[str, str]) -> bytes:
+    if _INIT_DATA_KEYS.issuperset(fields):
+        keys = [k for k in _INIT_DATA_KEY_ORDER if k in fields]
+    else:
+        # Unknown keys (newer Telegram clients): fall back to a generic key sort.
+        keys = sorted(fields)
+    data_check_string = "\n".join([f"{k}={fields[k]}" for k in keys if k != "hash"])
+    mac = _webapp_hmac(bot_token).copy()
+    mac.update(data_check_string.encode("utf-8"))
+    return mac.digest()
 
 
 def parse_and_validate_init_data(
@@ -34,8 +78,11 @@ def parse_and_validate_init_data(
     got_hash = fields.get("hash")
     if not got_hash:
         raise MiniAppAuthError("initData hash is missing")
-    expected = _calc_webapp_hash(bot_token, fields)
-    if not hmac.compare_digest(got_hash, expected):
+    try:
+        got_digest = bytes.fromhex(got_hash)
+    except ValueError as exc:
+        raise MiniAppAuthError("initData hash mismatch") from exc
+    if not hmac.compare_digest(got_digest, _calc_webapp_hash(bot_token, fields)):
         raise MiniAppAuthError("initData hash mismatch")
     auth_date_raw = (fields.get("auth_date") or "").strip()
     if not auth_date_raw:
@@ -55,6 +102,6 @@ def parse_and_validate_init_data(
     if not user_raw:
         raise MiniAppAuthError("initData user is missing")
     try:
-        return json.loads(user_raw)
-    except json.JSONDecodeError as exc:
+        return orjson.loads(user_raw)
+    except orjson.JSONDecodeError as exc:
         raise MiniAppAuthError("initData user is invalid JSON") from exc
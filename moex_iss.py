@@ -1,20 +1,42 @@
 import asyncio
 import aiohttp
 import logging
+import orjson
 import os
 import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from contextvars import ContextVar
 from datetime import date, datetime
+from functools import lru_cache
+from operator import itemgetter, not_
+from typing import Any, Callable
 from zoneinfo import ZoneInfo
 
+from yarl import URL
+
 ISS_BASE = "https://iss.moex.com/iss"
 ALGOPACK_BASE = "https://apim.moex.com/iss"
 logger = logging.getLogger(__name__)
 ISS_RETRIES = 3
 ISS_RETRY_DELAY_SEC = 0.6
+ISS_RETRY_MAX_DELAY_SEC = 8.0
 ISS_TIMEOUT = aiohttp.ClientTimeout(total=12, connect=4, sock_connect=4, sock_read=8)
 MOEX_HTTP_CONCURRENCY = max(1, int((os.getenv("MOEX_HTTP_CONCURRENCY") or "6").strip() or "6"))
+# Optional cap on requests per second per MOEX host; 0 (default) disables the limiter
+# and leaves pacing to MOEX_HTTP_CONCURRENCY.
+MOEX_HTTP_RATE_PER_SEC = max(0.0, float((os.getenv("MOEX_HTTP_RATE_PER_SEC") or "0").strip() or "0"))
+# Parsed-response cache for MOEX GETs; snapshot endpoints use the short TTL.
+ISS_RESPONSE_CACHE_TTL_SEC = max(0.0, float((os.getenv("ISS_RESPONSE_CACHE_TTL_SEC") or "10").strip() or "10"))
+ISS_RESPONSE_CACHE_MAX_SIZE = max(1, int((os.getenv("ISS_RESPONSE_CACHE_MAX_SIZE") or "1024").strip() or "1024"))
+_ISS_SEARCH_CACHE_TTL_SEC = 300.0
+_ISS_REFERENCE_CACHE_TTL_SEC = 3600.0
+# Start the ISS fallback alongside a slow ALGOPACK request after this many seconds; 0 disables hedging.
+ALGOPACK_HEDGE_DELAY_SEC = max(0.0, float((os.getenv("ALGOPACK_HEDGE_DELAY_SEC") or "1.0").strip() or "1.0"))
+# Tabular ISS JSON compresses well; pinned explicitly so every MOEX session asks for it.
+MOEX_REQUEST_HEADERS = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
 ISS_FALLBACK_FROM_HOUR_MSK = int((os.getenv("ISS_FALLBACK_FROM_HOUR_MSK") or "10").strip() or "10")
 
 ASSET_TYPE_STOCK = "stock"
@@ -29,9 +51,45 @@ class DataSourceFlags:
     delayed_data_used: bool = False
 
 
+class _TokenBucket:
+    """
+    Ограничитель частоты запросов: не больше rate запросов в секунду с допустимым всплеском burst.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._updated is not None:
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self._rate)
+            # The wait pays for exactly one token. Spend it directly instead of re-reading the
+            # clock: float rounding could otherwise leave the bucket a hair short on every pass.
+            self._tokens = 0.0
+            self._updated = loop.time()
+
+
 _data_source_flags_var: ContextVar[DataSourceFlags | None] = ContextVar("moex_data_source_flags", default=None)
 _moex_http_sem = asyncio.Semaphore(MOEX_HTTP_CONCURRENCY)
+_moex_rate_limiters: dict[str, _TokenBucket] = {}
+_inflight_requests: dict[tuple, asyncio.Future] = {}
+_response_cache: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
 _last_price_cache: dict[tuple[str, str, str], tuple[float, float]] = {}
+_shared_session: aiohttp.ClientSession | None = None
+_shared_session_loop: asyncio.AbstractEventLoop | None = None
+_content_encoding_logged: set[str] = set()
 LAST_PRICE_CACHE_TTL_SEC = max(5, int((os.getenv("LAST_PRICE_CACHE_TTL_SEC") or "300").strip() or "300"))
 
 
@@ -49,6 +107,26 @@ def _board_for_path(boardid: str | None, default: str) -> str:
     return (_norm_boardid(boardid, default) or default).lower()
 
 
+# Paths repeat for the same board/security across handlers and jobs, so each one is
+# built once and the same string object is reused in request and cache keys.
+@lru_cache(maxsize=1024)
+def _shares_security_path(boardid: str | None, secid: str, history: bool = False) -> str:
+    prefix = "/history" if history else ""
+    return f"{prefix}/engines/stock/markets/shares/boards/{_board_for_path(boardid, 'TQBR')}/securities/{secid}.json"
+
+
+@lru_cache(maxsize=64)
+def _shares_board_path(boardid: str | None, history: bool = False) -> str:
+    prefix = "/history" if history else ""
+    return f"{prefix}/engines/stock/markets/shares/boards/{_board_for_path(boardid, 'TQBR')}/securities.json"
+
+
+@lru_cache(maxsize=256)
+def _selt_security_path(boardid: str | None, secid: str, history: bool = False) -> str:
+    prefix = "/history" if history else ""
+    return f"{prefix}/engines/currency/markets/selt/boards/{_board_for_path(boardid, 'CETS')}/securities/{secid}.json"
+
+
 def reset_data_source_flags() -> None:
     _data_source_flags_var.set(DataSourceFlags())
 
@@ -66,6 +144,7 @@ def mark_delayed_data_used() -> None:
     flags.delayed_data_used = True
 
 
+@lru_cache(maxsize=1)
 def _get_algopack_api_key() -> str:
     for key in (
         "ALGOPACK_API_KEY",
@@ -79,6 +158,84 @@ def _get_algopack_api_key() -> str:
     return ""
 
 
+@lru_cache(maxsize=1)
+def _algopack_auth_headers() -> dict | None:
+    # Shared across requests; aiohttp copies headers into the request, so this dict is never mutated.
+    token = _get_algopack_api_key()
+    return {"Authorization": f"Bearer {token}"} if token else None
+
+
+def reset_algopack_auth_cache() -> None:
+    # The key is read from the environment once per process; call this after rotating it.
+    _get_algopack_api_key.cache_clear()
+    _algopack_auth_headers.cache_clear()
+
+
+def _get_shared_session() -> aiohttp.ClientSession:
+    global _shared_session, _shared_session_loop
+    loop = asyncio.get_running_loop()
+    # A session is bound to its event loop, so a new loop (e.g. another asyncio.run) gets its own.
+    if _shared_session is None or _shared_session.closed or _shared_session_loop is not loop:
+        # Keep-alive connections to ISS/ALGOPACK are reused across bot handlers and jobs.
+        connector = aiohttp.TCPConnector(
+            limit=MOEX_HTTP_CONCURRENCY * 2,
+            limit_per_host=MOEX_HTTP_CONCURRENCY,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        # MOEX APIs are stateless, so skip cookie parsing and storage on every response.
+        _shared_session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            headers=MOEX_REQUEST_HEADERS,
+        )
+        _shared_session_loop = loop
+    return _shared_session
+
+
+@asynccontextmanager
+async def moex_session():
+    """
+    Общая HTTP-сессия для запросов к MOEX; не закрывается при выходе из блока.
+    """
+    yield _get_shared_session()
+
+
+async def close_moex_session() -> None:
+    global _shared_session, _shared_session_loop
+    session, _shared_session, _shared_session_loop = _shared_session, None, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def _acquire_rate_limit(base: str) -> None:
+    if MOEX_HTTP_RATE_PER_SEC <= 0:
+        return
+    limiter = _moex_rate_limiters.get(base)
+    if limiter is None:
+        limiter = _TokenBucket(MOEX_HTTP_RATE_PER_SEC, max(1.0, MOEX_HTTP_RATE_PER_SEC))
+        _moex_rate_limiters[base] = limiter
+    await limiter.acquire()
+
+
+def _retry_delay(attempt: int, retry_after: str | None = None) -> float:
+    # Exponential backoff with full jitter, so concurrent retries do not line up.
+    delay = random.uniform(0.0, min(ISS_RETRY_MAX_DELAY_SEC, ISS_RETRY_DELAY_SEC * 2 ** (attempt - 1)))
+    if retry_after:
+        try:
+            # Honor the server's hint, capped so a bot reply is never stalled for long.
+            delay = max(delay, min(float(retry_after), ISS_RETRY_MAX_DELAY_SEC))
+        except ValueError:
+            pass
+    return delay
+
+
+@lru_cache(maxsize=1024)
+def _request_url(base: str, path: str) -> URL:
+    # Paths repeat per instrument, so parse each URL once and hand aiohttp a ready URL object.
+    return URL(f"{base}{path}")
+
+
 async def _request_json(
     session: aiohttp.ClientSession,
     base: str,
@@ -87,27 +244,116 @@ async def _request_json(
     headers: dict | None = None,
     source_name: str = "iss",
 ) -> dict:
-    url = f"{base}{path}"
+    # Identical GETs issued concurrently (e.g. several users refreshing the same
+    # instrument) share one upstream request. The cache and the in-flight task hold
+    # the raw body, and every caller decodes its own copy, so a caller mutating its
+    # result cannot leak into anyone else's.
+    key = (base, path, tuple(sorted((k, str(v)) for k, v in params.items())) if params else ())
+    cached = _response_cache.get(key)
+    if cached is not None:
+        if cached[0] > time.monotonic():
+            _response_cache.move_to_end(key)
+            return orjson.loads(cached[1])
+        _response_cache.pop(key, None)
+    task = _inflight_requests.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_json_cached(key, session, base, path, params, headers, source_name))
+        _inflight_requests[key] = task
+        task.add_done_callback(lambda t: _inflight_request_done(key, t))
+    # shield keeps the shared request alive if one of its waiters is cancelled.
+    return orjson.loads(await asyncio.shield(task))
+
+
+def _inflight_request_done(key: tuple, task: asyncio.Future) -> None:
+    _inflight_requests.pop(key, None)
+    if not task.cancelled():
+        # Mark the exception as retrieved even if every waiter went away.
+        task.exception()
+
+
+def _response_cache_ttl(path: str, params: dict | None) -> float:
+    if path.startswith("/history/"):
+        # Only ranges that ended before today are final; today's row still changes intraday.
+        till = str((params or {}).get("till") or "")
+        if till and till < datetime.now(MSK_TZ).date().isoformat():
+            return _ISS_REFERENCE_CACHE_TTL_SEC
+        return ISS_RESPONSE_CACHE_TTL_SEC
+    if path == "/securities.json":
+        return _ISS_SEARCH_CACHE_TTL_SEC
+    if path.endswith("/securities.json") and params and "marketdata.columns" not in params:
+        # Board listings without marketdata (shortnames) are reference data.
+        return _ISS_REFERENCE_CACHE_TTL_SEC
+    return ISS_RESPONSE_CACHE_TTL_SEC
+
+
+def reset_iss_cache() -> None:
+    _response_cache.clear()
+
+
+async def _fetch_json_cached(
+    key: tuple,
+    session: aiohttp.ClientSession,
+    base: str,
+    path: str,
+    params: dict | None,
+    headers: dict | None,
+    source_name: str,
+) -> bytes:
+    raw = await _fetch_json(session, base, path, params, headers, source_name)
+    ttl = _response_cache_ttl(path, params)
+    if ttl > 0:
+        _response_cache[key] = (time.monotonic() + ttl, raw)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > ISS_RESPONSE_CACHE_MAX_SIZE:
+            _response_cache.popitem(last=False)
+    return raw
+
+
+async def _fetch_json(
+    session: aiohttp.ClientSession,
+    base: str,
+    path: str,
+    params: dict | None,
+    headers: dict | None,
+    source_name: str,
+) -> bytes:
+    url = _request_url(base, path)
     last_exc: Exception | None = None
     for attempt in range(1, ISS_RETRIES + 1):
+        retry_after: str | None = None
         try:
+            # Pace requests up front so concurrent fan-out does not trip 429s and back off.
+            await _acquire_rate_limit(base)
             async with _moex_http_sem:
                 async with session.get(url, params=params, timeout=ISS_TIMEOUT, headers=headers) as resp:
-                    if resp.status in {429, 500, 502, 503, 504}:
-                        if attempt < ISS_RETRIES:
-                            logger.warning(
-                                "%s temporary HTTP status=%s url=%s attempt=%s/%s",
+                    if resp.status in {429, 500, 502, 503, 504} and attempt < ISS_RETRIES:
+                        logger.warning(
+                            "%s temporary HTTP status=%s url=%s attempt=%s/%s",
+                            source_name.upper(),
+                            resp.status,
+                            url,
+                            attempt,
+                            ISS_RETRIES,
+                        )
+                        if resp.status == 429:
+                            retry_after = resp.headers.get("Retry-After")
+                    else:
+                        resp.raise_for_status()
+                        if source_name not in _content_encoding_logged:
+                            _content_encoding_logged.add(source_name)
+                            logger.debug(
+                                "%s Content-Encoding=%s",
                                 source_name.upper(),
-                                resp.status,
-                                url,
-                                attempt,
-                                ISS_RETRIES,
+                                resp.headers.get("Content-Encoding") or "identity",
                             )
-                            sleep_s = ISS_RETRY_DELAY_SEC * attempt + random.uniform(0.0, 0.35)
-                            await asyncio.sleep(sleep_s)
-                            continue
-                    resp.raise_for_status()
-                    return await resp.json()
+                        raw = await resp.read()
+                        try:
+                            # Validated here so a bad body stays on the ClientError retry path,
+                            # as resp.json() did; callers decode their own copy of raw.
+                            orjson.loads(raw)
+                        except orjson.JSONDecodeError as exc:
+                            raise aiohttp.ClientPayloadError(f"invalid JSON from {url}") from exc
+                        return raw
         except asyncio.CancelledError:
             raise
         except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
@@ -121,8 +367,7 @@ async def _request_json(
                     ISS_RETRIES,
                     exc.__class__.__name__,
                 )
-                sleep_s = ISS_RETRY_DELAY_SEC * attempt + random.uniform(0.0, 0.35)
-                await asyncio.sleep(sleep_s)
+                await asyncio.sleep(_retry_delay(attempt))
                 continue
             logger.error(
                 "%s request failed after retries: %s params=%s error=%s",
@@ -132,6 +377,8 @@ async def _request_json(
                 exc.__class__.__name__,
             )
             raise
+        # Back off outside the semaphore so a waiting retry does not hold a connection slot.
+        await asyncio.sleep(_retry_delay(attempt, retry_after))
     if last_exc is not None:
         raise last_exc
     raise RuntimeError(f"{source_name.upper()} request failed unexpectedly: {url}")
@@ -142,19 +389,52 @@ async def iss_get_json(session: aiohttp.ClientSession, path: str, params: dict |
 
 
 async def algopack_get_json(session: aiohttp.ClientSession, path: str, params: dict | None = None) -> dict:
-    token = _get_algopack_api_key()
-    if not token:
+    headers = _algopack_auth_headers()
+    if headers is None:
         raise RuntimeError("ALGOPACK API key is not configured")
     return await _request_json(
         session,
         ALGOPACK_BASE,
         path,
         params=params,
-        headers={"Authorization": f"Bearer {token}"},
+        headers=headers,
         source_name="algopack",
     )
 
 
+async def _hedge_with_iss(
+    session: aiohttp.ClientSession,
+    path: str,
+    params: dict | None,
+    algopack_task: asyncio.Future,
+) -> tuple[dict, bool]:
+    """
+    ALGOPACK отвечает медленно: параллельно запрашиваем ISS и берём первый успешный ответ.
+    """
+    logger.info("ALGOPACK is slow, hedging with ISS path=%s", path)
+    iss_task = asyncio.ensure_future(iss_get_json(session, path, params=params))
+    pending = {algopack_task, iss_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Real-time data wins a tie; a failed source just leaves the other to finish.
+            if algopack_task in done and algopack_task.exception() is None:
+                return algopack_task.result(), False
+            if iss_task in done and iss_task.exception() is None:
+                mark_delayed_data_used()
+                return iss_task.result(), True
+    finally:
+        for task in pending:
+            task.cancel()
+    logger.warning(
+        "ALGOPACK failed, fallback to ISS path=%s error=%s",
+        path,
+        algopack_task.exception().__class__.__name__,
+    )
+    mark_delayed_data_used()
+    raise iss_task.exception()
+
+
 async def get_json_with_fallback_source(
     session: aiohttp.ClientSession,
     path: str,
@@ -162,14 +442,26 @@ async def get_json_with_fallback_source(
 ) -> tuple[dict, bool]:
     token = _get_algopack_api_key()
     if token:
+        algopack_task = asyncio.ensure_future(algopack_get_json(session, path, params=params))
+        if ALGOPACK_HEDGE_DELAY_SEC > 0:
+            try:
+                done, _ = await asyncio.wait({algopack_task}, timeout=ALGOPACK_HEDGE_DELAY_SEC)
+            except BaseException:
+                algopack_task.cancel()
+                raise
+            if not done:
+                # The hedge has already asked ISS, so its failure is final rather than another fallback.
+                return await _hedge_with_iss(session, path, params, algopack_task)
         try:
-            return await algopack_get_json(session, path, params=params), False
+            return await algopack_task, False
         except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
             logger.warning(
                 "ALGOPACK failed, fallback to ISS path=%s error=%s",
                 path,
                 exc.__class__.__name__,
             )
+        finally:
+            algopack_task.cancel()
     else:
         logger.debug("ALGOPACK API key is missing, using ISS fallback path=%s", path)
 
@@ -181,28 +473,83 @@ async def get_json_with_fallback(session: aiohttp.ClientSession, path: str, para
     data, _ = await get_json_with_fallback_source(session, path, params=params)
     return data
 
-async def search_securities(session: aiohttp.ClientSession, query: str) -> list[dict]:
+
+def _is_none(value: Any) -> bool:
+    return value is None
+
+
+async def _fetch_with_iss_retry(
+    session: aiohttp.ClientSession,
+    path: str,
+    params: dict | None,
+    parser: Callable[[dict], Any],
+    label: str,
+    is_empty: Callable[[Any], bool] = _is_none,
+    allow_iss_retry: bool = True,
+) -> tuple[Any, bool]:
     """
-    Поиск тикера/ISIN/названия через ISS.
-    Делаем общий поиск и приоритизируем торгуемые акции (group=stock_shares, is_traded=1).
+    ALGOPACK с fallback на ISS; если ALGOPACK ответил, но parser вернул пустой результат,
+    повторяет запрос через ISS. Возвращает (parser(data), флаг использования ISS).
     """
-    q = query.strip()
-    if not q:
-        return []
+    data, delayed = await get_json_with_fallback_source(session, path, params=params)
+    result = parser(data)
+    if delayed or not allow_iss_retry or not is_empty(result):
+        return result, delayed
+    logger.warning("ALGOPACK returned empty %s path=%s; retry via ISS", label, path)
+    mark_delayed_data_used()
+    data = await iss_get_json(session, path, params=params)
+    return parser(data), True
 
+
+def _parse_last_marketdata(data: dict) -> float | None:
+    md = data.get("marketdata", {})
+    rows = md.get("data", [])
+    if not rows:
+        return None
+    # Only one column is needed, so find it directly instead of indexing all of them.
+    try:
+        last_i = md.get("columns", []).index("LAST")
+    except ValueError:
+        return None
+    last = rows[0][last_i]
+    if last is None:
+        return None
+    return float(last)
+
+
+def _with_marketdata(data: dict) -> dict | None:
+    return data if data.get("marketdata", {}).get("data") else None
+
+
+def _with_history(data: dict) -> dict | None:
+    return data if data.get("history", {}).get("data") else None
+
+
+async def _search_securities_rows(session: aiohttp.ClientSession, q: str, kind: str) -> list[dict]:
+    # All searches share one /securities.json query and differ only in how callers
+    # filter it, so concurrent identical queries are coalesced by _request_json.
     params = {
         "q": q,
         "iss.meta": "off",
         "lang": "ru",
         "limit": 50,
     }
-    data, delayed = await get_json_with_fallback_source(session, "/securities.json", params=params)
-    all_results = _parse_securities_rows(data)
-    if not all_results and not delayed:
-        logger.warning("ALGOPACK search returned empty set for query=%r; retry via ISS", q)
-        mark_delayed_data_used()
-        data = await iss_get_json(session, "/securities.json", params=params)
-        all_results = _parse_securities_rows(data)
+    all_results, _ = await _fetch_with_iss_retry(
+        session, "/securities.json", params, _parse_securities_rows, f"{kind} search", is_empty=not_
+    )
+    return all_results
+
+
+async def search_securities(session: aiohttp.ClientSession, query: str) -> list[dict]:
+    """
+    Поиск тикера/ISIN/названия через ISS.
+    Делаем общий поиск и приоритизируем торгуемые акции (group=stock_shares, is_traded=1).
+    """
+    q = query.strip()
+    if not q:
+        return []
+
+    all_results = await _search_securities_rows(session, q, "search")
 
     # Приоритет: акции, торгуемые сейчас.
     traded_shares = [x for x in all_results if x.get("group") == "stock_shares" and x.get("is_traded") == 1]
@@ -222,19 +569,7 @@ async def search_metals(session: aiohttp.ClientSession, query: str) -> list[dict
     if not q:
         return []
 
-    params = {
-        "q": q,
-        "iss.meta": "off",
-        "lang": "ru",
-        "limit": 50,
-    }
-    data, delayed = await get_json_with_fallback_source(session, "/securities.json", params=params)
-    all_results = _parse_securities_rows(data)
-    if not all_results and not delayed:
-        logger.warning("ALGOPACK metal search returned empty set for query=%r; retry via ISS", q)
-        mark_delayed_data_used()
-        data = await iss_get_json(session, "/securities.json", params=params)
-        all_results = _parse_securities_rows(data)
+    all_results = await _search_securities_rows(session, q, "metal search")
     metals = [x for x in all_results if x.get("group") == "currency_metal" and x.get("is_traded") == 1]
     logger.info("ISS metal search query=%r results=%s total=%s", q, len(metals), len(all_results))
     return metals
@@ -247,19 +582,7 @@ async def search_fiat(session: aiohttp.ClientSession, query: str) -> list[dict]:
     if not q:
         return []
 
-    params = {
-        "q": q,
-        "iss.meta": "off",
-        "lang": "ru",
-        "limit": 50,
-    }
-    data, delayed = await get_json_with_fallback_source(session, "/securities.json", params=params)
-    all_results = _parse_securities_rows(data)
-    if not all_results and not delayed:
-        logger.warning("ALGOPACK fiat search returned empty set for query=%r; retry via ISS", q)
-        mark_delayed_data_used()
-        data = await iss_get_json(session, "/securities.json", params=params)
-        all_results = _parse_securities_rows(data)
+    all_results = await _search_securities_rows(session, q, "fiat search")
 
     def is_fiat(row: dict) -> bool:
         boardid = str(row.get("boardid") or "").upper()
@@ -308,21 +631,7 @@ async def get_last_price_stock_shares(session: aiohttp.ClientSession, secid: str
     """
     secid_norm = _norm_secid(secid)
     boardid_norm = _norm_boardid(boardid, "TQBR")
-    path = f"/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities/{secid_norm}.json"
-
-    def parse_last(data: dict) -> float | None:
-        md = data.get("marketdata", {})
-        cols = md.get("columns", [])
-        rows = md.get("data", [])
-        if not rows:
-            return None
-        idx = {c: i for i, c in enumerate(cols)}
-        if "LAST" not in idx:
-            return None
-        last = rows[0][idx["LAST"]]
-        if last is None:
-            return None
-        return float(last)
+    path = _shares_security_path(boardid_norm, secid_norm)
 
     cache_key = (ASSET_TYPE_STOCK, secid_norm, boardid_norm or "")
     now_ts = asyncio.get_running_loop().time()
@@ -330,41 +639,66 @@ async def get_last_price_stock_shares(session: aiohttp.ClientSession, secid: str
     if cached and (now_ts - cached[1] <= LAST_PRICE_CACHE_TTL_SEC):
         return cached[0]
 
-    data, delayed = await get_json_with_fallback_source(session, path, params={"iss.meta": "off"})
-    price = parse_last(data)
-    if price is None and not delayed:
-        logger.warning("ALGOPACK returned no LAST for secid=%s boardid=%s; retry via ISS", secid_norm, boardid_norm)
-        mark_delayed_data_used()
-        data = await iss_get_json(session, path, params={"iss.meta": "off"})
-        price = parse_last(data)
+    price, _ = await _fetch_with_iss_retry(session, path, {"iss.meta": "off"}, _parse_last_marketdata, "LAST")
     if price is None:
-        logger.warning("No LAST marketdata for secid=%s boardid=%s", secid_norm, boardid_norm)
+        logger.debug("No LAST marketdata for secid=%s boardid=%s", secid_norm, boardid_norm)
         return None
     _last_price_cache[cache_key] = (price, now_ts)
     logger.debug("Last price secid=%s boardid=%s last=%s", secid_norm, boardid_norm, price)
     return price
 
+async def get_last_prices_bulk(
+    session: aiohttp.ClientSession,
+    secids: list[str],
+    boardid: str | None = None,
+) -> dict[str, float]:
+    """
+    LAST для нескольких акций одной доски: один запрос на каждые 50 бумаг вместо запроса на бумагу.
+    Найденные цены также попадают в кэш последних цен.
+    """
+    boardid_norm = _norm_boardid(boardid, "TQBR")
+    path = _shares_board_path(boardid_norm)
+    unique = list(dict.fromkeys(s for s in map(_norm_secid, secids) if s))
+
+    async def load_chunk(chunk: list[str]) -> dict:
+        params = {
+            "iss.meta": "off",
+            "iss.only": "marketdata",
+            "securities": ",".join(chunk),
+            "marketdata.columns": "SECID,LAST",
+        }
+        data, _ = await get_json_with_fallback_source(session, path, params=params)
+        return data
+
+    pages = await asyncio.gather(*(load_chunk(unique[i:i + 50]) for i in range(0, len(unique), 50)))
+    now_ts = asyncio.get_running_loop().time()
+    out: dict[str, float] = {}
+    for data in pages:
+        md = data.get("marketdata", {})
+        cols = md.get("columns", [])
+        try:
+            secid_i = cols.index("SECID")
+            last_i = cols.index("LAST")
+        except ValueError:
+            continue
+        for row in md.get("data", []):
+            secid = row[secid_i]
+            last = row[last_i]
+            if not secid or last is None:
+                continue
+            price = float(last)
+            out[secid] = price
+            _last_price_cache[(ASSET_TYPE_STOCK, secid, boardid_norm or "")] = (price, now_ts)
+    return out
+
+
 async def get_last_price_metal(session: aiohttp.ClientSession, secid: str, boardid: str | None = None) -> float | None:
     """
     Для металлов (currency_metal) берём marketdata.LAST на engine=currency, market=selt.
     """
     secid_norm = _norm_secid(secid)
     boardid_norm = _norm_boardid(boardid, "CETS")
-    path = f"/engines/currency/markets/selt/boards/{_board_for_path(boardid_norm, 'CETS')}/securities/{secid_norm}.json"
-
-    def parse_last(data: dict) -> float | None:
-        md = data.get("marketdata", {})
-        cols = md.get("columns", [])
-        rows = md.get("data", [])
-        if not rows:
-            return None
-        idx = {c: i for i, c in enumerate(cols)}
-        if "LAST" not in idx:
-            return None
-        last = rows[0][idx["LAST"]]
-        if last is None:
-            return None
-        return float(last)
+    path = _selt_security_path(boardid_norm, secid_norm)
 
     cache_key = (ASSET_TYPE_METAL, secid_norm, boardid_norm or "")
     now_ts = asyncio.get_running_loop().time()
@@ -372,23 +706,19 @@ async def get_last_price_metal(session: aiohttp.ClientSession, secid: str, board
     if cached and (now_ts - cached[1] <= LAST_PRICE_CACHE_TTL_SEC):
         return cached[0]
 
-    data, delayed = await get_json_with_fallback_source(session, path, params={"iss.meta": "off"})
-    price = parse_last(data)
-    if price is None and not delayed:
-        now_msk = datetime.now(MSK_TZ)
-        if now_msk.hour < ISS_FALLBACK_FROM_HOUR_MSK:
-            logger.info(
-                "Skip ISS fallback for metal before %02d:00 MSK secid=%s",
-                ISS_FALLBACK_FROM_HOUR_MSK,
-                secid_norm,
-            )
-            return None
-        logger.warning("ALGOPACK returned no metal LAST for secid=%s boardid=%s; retry via ISS", secid_norm, boardid_norm)
-        mark_delayed_data_used()
-        data = await iss_get_json(session, path, params={"iss.meta": "off"})
-        price = parse_last(data)
+    allow_iss_retry = datetime.now(MSK_TZ).hour >= ISS_FALLBACK_FROM_HOUR_MSK
+    price, delayed = await _fetch_with_iss_retry(
+        session, path, {"iss.meta": "off"}, _parse_last_marketdata, "metal LAST", allow_iss_retry=allow_iss_retry
+    )
+    if price is None and not delayed and not allow_iss_retry:
+        logger.info(
+            "Skip ISS fallback for metal before %02d:00 MSK secid=%s",
+            ISS_FALLBACK_FROM_HOUR_MSK,
+            secid_norm,
+        )
+        return None
     if price is None:
-        logger.warning("No metal LAST marketdata for secid=%s boardid=%s", secid_norm, boardid_norm)
+        logger.debug("No metal LAST marketdata for secid=%s boardid=%s", secid_norm, boardid_norm)
         return None
     _last_price_cache[cache_key] = (price, now_ts)
     logger.debug("Last metal price secid=%s boardid=%s last=%s", secid_norm, boardid_norm, price)
@@ -431,7 +761,7 @@ async def get_last_price_fiat(
         candidates.append(secid_norm)
 
     for candidate in candidates:
-        path = f"/engines/currency/markets/selt/boards/{_board_for_path(norm_boardid, 'CETS')}/securities/{candidate}.json"
+        path = _selt_security_path(norm_boardid, candidate)
         try:
             data, delayed = await get_json_with_fallback_source(session, path, params={"iss.meta": "off"})
         except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as exc:
@@ -445,7 +775,7 @@ async def get_last_price_fiat(
         price = _parse_marketdata_price(data)
         if price is None and not delayed:
             if not allow_iss_fallback:
-                logger.info(
+                logger.debug(
                     "Skip ISS fallback for fiat secid=%s boardid=%s (fast mode)",
                     candidate,
                     norm_boardid,
@@ -488,6 +818,24 @@ async def get_usd_rub_rate(session: aiohttp.ClientSession) -> float | None:
     return await get_last_price_fiat(session, "USD000UTSTOM", "CETS", allow_iss_fallback=True)
 
 
+def get_cached_last_price(secid: str, boardid: str | None, asset_type: str) -> float | None:
+    """
+    Fresh LAST from the in-process cache without any I/O; None on miss or expiry.
+    Uses the same key normalisation as get_last_price_* so hits line up exactly.
+    """
+    secid_norm = _norm_secid(secid)
+    if asset_type == ASSET_TYPE_METAL:
+        cache_key = (ASSET_TYPE_METAL, secid_norm, _norm_boardid(boardid, "CETS") or "")
+    elif asset_type == ASSET_TYPE_FIAT:
+        cache_key = (ASSET_TYPE_FIAT, secid_norm, _norm_boardid(boardid, "CETS") or "CETS")
+    else:
+        cache_key = (ASSET_TYPE_STOCK, secid_norm, _norm_boardid(boardid, "TQBR") or "")
+    cached = _last_price_cache.get(cache_key)
+    if cached and (asyncio.get_running_loop().time() - cached[1] <= LAST_PRICE_CACHE_TTL_SEC):
+        return cached[0]
+    return None
+
+
 async def get_last_price_by_asset_type(
     session: aiohttp.ClientSession,
     secid: str,
@@ -501,41 +849,47 @@ async def get_last_price_by_asset_type(
     return await get_last_price_stock_shares(session, secid, boardid)
 
 
+@lru_cache(maxsize=64)
+def _col_index(cols: tuple) -> dict[str, int]:
+    # ISS returns the same column list for a given endpoint, so the map is built once per schema.
+    # The returned dict is shared between callers and must not be mutated.
+    return {str(c).upper(): i for i, c in enumerate(cols)}
+
+
+def _opt_float(raw) -> float | None:
+    if raw is None:
+        return None
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return None
+
+
 async def get_stock_day_movers(session: aiohttp.ClientSession, boardid: str = "TQBR") -> list[dict]:
     """
     Возвращает список акций с изменением за текущую торговую сессию:
     OPEN (цена открытия) -> LAST (последняя цена).
     """
     boardid_norm = _norm_boardid(boardid, "TQBR") or "TQBR"
-    path = f"/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities.json"
+    path = _shares_board_path(boardid_norm)
     out: list[dict] = []
     params = {
         "iss.meta": "off",
         "securities.columns": "SECID,SHORTNAME",
         "marketdata.columns": "SECID,OPEN,LAST,VOLTODAY,VALTODAY",
     }
-    data, delayed = await get_json_with_fallback_source(session, path, params=params)
+    data, _ = await _fetch_with_iss_retry(session, path, params, _with_marketdata, "movers")
+    if data is None:
+        return out
     sec = data.get("securities", {})
-    md = data.get("marketdata", {})
+    md = data["marketdata"]
     sec_cols = sec.get("columns", [])
     sec_rows = sec.get("data", [])
     md_cols = md.get("columns", [])
-    md_rows = md.get("data", [])
-    if not md_rows and not delayed:
-        logger.warning("ALGOPACK movers response is empty for board=%s; retry via ISS", boardid_norm)
-        mark_delayed_data_used()
-        data = await iss_get_json(session, path, params=params)
-        sec = data.get("securities", {})
-        md = data.get("marketdata", {})
-        sec_cols = sec.get("columns", [])
-        sec_rows = sec.get("data", [])
-        md_cols = md.get("columns", [])
-        md_rows = md.get("data", [])
-    if not md_rows:
-        return out
+    md_rows = md["data"]
 
-    sec_idx = {str(c).upper(): i for i, c in enumerate(sec_cols)}
-    md_idx = {str(c).upper(): i for i, c in enumerate(md_cols)}
+    sec_idx = _col_index(tuple(sec_cols))
+    md_idx = _col_index(tuple(md_cols))
     secid_i = sec_idx.get("SECID")
     shortname_i = sec_idx.get("SHORTNAME")
     md_secid_i = md_idx.get("SECID")
@@ -558,37 +912,25 @@ async def get_stock_day_movers(session: aiohttp.ClientSession, boardid: str = "T
             shortname = str(row[shortname_i] or "").strip()
         names[secid] = shortname
 
+    # Columns are resolved once; each row is then unpacked by a single itemgetter call.
+    pick = itemgetter(md_secid_i, open_i, last_i)
+    min_len = max(md_secid_i, open_i, last_i) + 1
     for row in md_rows:
-        secid = str(row[md_secid_i] or "").strip()
-        if not secid:
+        if len(row) < min_len:
             continue
-        open_px = row[open_i] if open_i < len(row) else None
-        last_px = row[last_i] if last_i < len(row) else None
-        if open_px is None or last_px is None:
+        secid, open_px, last_px = pick(row)
+        secid = str(secid or "").strip()
+        if not secid or open_px is None or last_px is None:
             continue
         try:
             open_f = float(open_px)
             last_f = float(last_px)
         except (TypeError, ValueError):
             continue
-        vol_today = None
-        if vol_i is not None and vol_i < len(row):
-            raw_vol = row[vol_i]
-            if raw_vol is not None:
-                try:
-                    vol_today = float(raw_vol)
-                except (TypeError, ValueError):
-                    vol_today = None
-        val_today = None
-        if val_i is not None and val_i < len(row):
-            raw_val = row[val_i]
-            if raw_val is not None:
-                try:
-                    val_today = float(raw_val)
-                except (TypeError, ValueError):
-                    val_today = None
         if open_f <= 0:
             continue
+        vol_today = _opt_float(row[vol_i]) if vol_i is not None and vol_i < len(row) else None
+        val_today = _opt_float(row[val_i]) if val_i is not None and val_i < len(row) else None
         pct = (last_f - open_f) / open_f * 100.0
         out.append(
             {
@@ -605,6 +947,79 @@ async def get_stock_day_movers(session: aiohttp.ClientSession, boardid: str = "T
     return out
 
 
+def _parse_history_movers_page(data: dict) -> list[dict]:
+    sec = data.get("securities", {})
+    hist = data.get("history", {})
+    sec_cols = sec.get("columns", [])
+    sec_rows = sec.get("data", [])
+    h_cols = hist.get("columns", [])
+    h_rows = hist.get("data", [])
+    out: list[dict] = []
+    sec_idx = _col_index(tuple(sec_cols))
+    h_idx = _col_index(tuple(h_cols))
+    secid_i = sec_idx.get("SECID")
+    shortname_i = sec_idx.get("SHORTNAME")
+    h_secid_i = h_idx.get("SECID")
+    open_i = h_idx.get("OPEN")
+    close_i = h_idx.get("CLOSE")
+    legal_i = h_idx.get("LEGALCLOSEPRICE")
+    wap_i = h_idx.get("WAPRICE")
+    vol_i = h_idx.get("VOLUME")
+    val_i = h_idx.get("VALUE")
+    if h_secid_i is None or open_i is None:
+        return out
+
+    names: dict[str, str] = {}
+    for row in sec_rows:
+        if secid_i is None or secid_i >= len(row):
+            continue
+        secid = str(row[secid_i] or "").strip()
+        if not secid:
+            continue
+        shortname = ""
+        if shortname_i is not None and shortname_i < len(row):
+            shortname = str(row[shortname_i] or "").strip()
+        names[secid] = shortname
+
+    # Close priority CLOSE -> LEGALCLOSEPRICE -> WAPRICE; absent columns are dropped once per page.
+    close_idxs = tuple(i for i in (close_i, legal_i, wap_i) if i is not None)
+    pick = itemgetter(h_secid_i, open_i)
+    min_len = max(h_secid_i, open_i) + 1
+    for row in h_rows:
+        if len(row) < min_len:
+            continue
+        secid, open_px = pick(row)
+        secid = str(secid or "").strip()
+        if not secid or open_px is None:
+            continue
+        row_len = len(row)
+        close_px = next((row[i] for i in close_idxs if i < row_len and row[i] is not None), None)
+        if close_px is None:
+            continue
+        try:
+            open_f = float(open_px)
+            close_f = float(close_px)
+        except (TypeError, ValueError):
+            continue
+        if open_f <= 0:
+            continue
+        vol_day = _opt_float(row[vol_i]) if vol_i is not None and vol_i < row_len else None
+        val_day = _opt_float(row[val_i]) if val_i is not None and val_i < row_len else None
+        pct = (close_f - open_f) / open_f * 100.0
+        out.append(
+            {
+                "secid": secid,
+                "shortname": names.get(secid) or secid,
+                "open": open_f,
+                "last": close_f,
+                "pct": pct,
+                "vol_today": vol_day,
+                "val_today": val_day,
+            }
+        )
+    return out
+
+
 async def get_stock_movers_by_date(
     session: aiohttp.ClientSession,
     trade_date: date,
@@ -619,128 +1034,18 @@ async def get_stock_movers_by_date(
         return await get_stock_day_movers(session, boardid=boardid)
 
     boardid_norm = _norm_boardid(boardid, "TQBR") or "TQBR"
-    path = f"/history/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities.json"
-    out: list[dict] = []
-    start = 0
-    use_iss_only = False
-
-    while True:
-        params = {
-            "iss.meta": "off",
-            "from": trade_date.isoformat(),
-            "till": trade_date.isoformat(),
-            "start": start,
-            "limit": 100,
-            "securities.columns": "SECID,SHORTNAME",
-            "history.columns": "SECID,OPEN,CLOSE,LEGALCLOSEPRICE,WAPRICE,VOLUME,VALUE",
-        }
-        if use_iss_only:
-            data = await iss_get_json(session, path, params=params)
-            delayed = True
-        else:
-            data, delayed = await get_json_with_fallback_source(session, path, params=params)
-            if delayed:
-                use_iss_only = True
-
-        sec = data.get("securities", {})
-        hist = data.get("history", {})
-        sec_cols = sec.get("columns", [])
-        sec_rows = sec.get("data", [])
-        h_cols = hist.get("columns", [])
-        h_rows = hist.get("data", [])
-
-        if not h_rows and start == 0 and not delayed:
-            logger.warning("ALGOPACK historical movers are empty for date=%s; retry via ISS", trade_date.isoformat())
-            mark_delayed_data_used()
-            data = await iss_get_json(session, path, params=params)
-            use_iss_only = True
-            sec = data.get("securities", {})
-            hist = data.get("history", {})
-            sec_cols = sec.get("columns", [])
-            sec_rows = sec.get("data", [])
-            h_cols = hist.get("columns", [])
-            h_rows = hist.get("data", [])
-
-        if not h_rows:
-            break
-
-        sec_idx = {str(c).upper(): i for i, c in enumerate(sec_cols)}
-        h_idx = {str(c).upper(): i for i, c in enumerate(h_cols)}
-        secid_i = sec_idx.get("SECID")
-        shortname_i = sec_idx.get("SHORTNAME")
-        h_secid_i = h_idx.get("SECID")
-        open_i = h_idx.get("OPEN")
-        close_i = h_idx.get("CLOSE")
-        legal_i = h_idx.get("LEGALCLOSEPRICE")
-        wap_i = h_idx.get("WAPRICE")
-        vol_i = h_idx.get("VOLUME")
-        val_i = h_idx.get("VALUE")
-        if h_secid_i is None or open_i is None:
-            break
-
-        names: dict[str, str] = {}
-        for row in sec_rows:
-            if secid_i is None or secid_i >= len(row):
-                continue
-            secid = str(row[secid_i] or "").strip()
-            if not secid:
-                continue
-            shortname = ""
-            if shortname_i is not None and shortname_i < len(row):
-                shortname = str(row[shortname_i] or "").strip()
-            names[secid] = shortname
-
-        for row in h_rows:
-            secid = str(row[h_secid_i] or "").strip()
-            if not secid:
-                continue
-            open_px = row[open_i] if open_i < len(row) else None
-            close_px = row[close_i] if close_i is not None and close_i < len(row) else None
-            if close_px is None and legal_i is not None and legal_i < len(row):
-                close_px = row[legal_i]
-            if close_px is None and wap_i is not None and wap_i < len(row):
-                close_px = row[wap_i]
-            if open_px is None or close_px is None:
-                continue
-            try:
-                open_f = float(open_px)
-                close_f = float(close_px)
-            except (TypeError, ValueError):
-                continue
-            if open_f <= 0:
-                continue
-            vol_day = None
-            if vol_i is not None and vol_i < len(row):
-                raw = row[vol_i]
-                if raw is not None:
-                    try:
-                        vol_day = float(raw)
-                    except (TypeError, ValueError):
-                        vol_day = None
-            val_day = None
-            if val_i is not None and val_i < len(row):
-                raw = row[val_i]
-                if raw is not None:
-                    try:
-                        val_day = float(raw)
-                    except (TypeError, ValueError):
-                        val_day = None
-            pct = (close_f - open_f) / open_f * 100.0
-            out.append(
-                {
-                    "secid": secid,
-                    "shortname": names.get(secid) or secid,
-                    "open": open_f,
-                    "last": close_f,
-                    "pct": pct,
-                    "vol_today": vol_day,
-                    "val_today": val_day,
-                }
-            )
-
-        if len(h_rows) < 100:
-            break
-        start += len(h_rows)
+    path = _shares_board_path(boardid_norm, history=True)
+    day = trade_date.isoformat()
+    base_params = {
+        "iss.meta": "off",
+        "from": day,
+        "till": day,
+        "limit": 100,
+        "securities.columns": "SECID,SHORTNAME",
+        "history.columns": "SECID,OPEN,CLOSE,LEGALCLOSEPRICE,WAPRICE,VOLUME,VALUE",
+    }
+    pages = await _fetch_history_pages(session, path, base_params, "historical movers")
+    out = [item for page in pages for item in _parse_history_movers_page(page)]
 
     missing = [x for x in out if not str(x.get("shortname") or "").strip() or str(x.get("shortname")).strip() == str(x.get("secid")).strip()]
     if missing:
@@ -766,33 +1071,24 @@ async def get_stock_snapshot(
 ) -> dict | None:
     secid_norm = _norm_secid(secid)
     boardid_norm = _norm_boardid(boardid, "TQBR") or "TQBR"
-    path = f"/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities/{secid_norm}.json"
+    path = _shares_security_path(boardid_norm, secid_norm)
     params = {
         "iss.meta": "off",
         "securities.columns": "SECID,SHORTNAME,NAME",
         "marketdata.columns": "SECID,OPEN,LAST,BID,OFFER,VOLTODAY,VALTODAY",
     }
-    data, delayed = await get_json_with_fallback_source(session, path, params=params)
+    data, _ = await _fetch_with_iss_retry(session, path, params, _with_marketdata, "snapshot")
+    if data is None:
+        return None
     sec = data.get("securities", {})
-    md = data.get("marketdata", {})
+    md = data["marketdata"]
     sec_cols = sec.get("columns", [])
     sec_rows = sec.get("data", [])
     md_cols = md.get("columns", [])
-    md_rows = md.get("data", [])
-    if not md_rows and not delayed:
-        mark_delayed_data_used()
-        data = await iss_get_json(session, path, params=params)
-        sec = data.get("securities", {})
-        md = data.get("marketdata", {})
-        sec_cols = sec.get("columns", [])
-        sec_rows = sec.get("data", [])
-        md_cols = md.get("columns", [])
-        md_rows = md.get("data", [])
-    if not md_rows:
-        return None
+    md_rows = md["data"]
 
-    md_idx = {str(c).upper(): i for i, c in enumerate(md_cols)}
-    sec_idx = {str(c).upper(): i for i, c in enumerate(sec_cols)}
+    md_idx = _col_index(tuple(md_cols))
+    sec_idx = _col_index(tuple(sec_cols))
     row = md_rows[0]
     sec_row = sec_rows[0] if sec_rows else []
 
@@ -837,7 +1133,7 @@ async def get_stock_avg_daily_volume(
 ) -> float | None:
     secid_norm = _norm_secid(secid)
     boardid_norm = _norm_boardid(boardid, "TQBR") or "TQBR"
-    path = f"/history/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities/{secid_norm}.json"
+    path = _shares_security_path(boardid_norm, secid_norm, history=True)
     till = date.today()
     from_dt = till.fromordinal(till.toordinal() - max(5, int(days * 2)))
     params = {
@@ -846,19 +1142,13 @@ async def get_stock_avg_daily_volume(
         "till": till.isoformat(),
         "history.columns": "TRADEDATE,VOLUME",
     }
-    data, delayed = await get_json_with_fallback_source(session, path, params=params)
-    hist = data.get("history", {})
-    cols = hist.get("columns", [])
-    rows = hist.get("data", [])
-    if not rows and not delayed:
-        mark_delayed_data_used()
-        data = await iss_get_json(session, path, params=params)
-        hist = data.get("history", {})
-        cols = hist.get("columns", [])
-        rows = hist.get("data", [])
-    if not rows:
+    data, _ = await _fetch_with_iss_retry(session, path, params, _with_history, "volume history")
+    if data is None:
         return None
-    idx = {str(c).upper(): i for i, c in enumerate(cols)}
+    hist = data["history"]
+    cols = hist.get("columns", [])
+    rows = hist["data"]
+    idx = _col_index(tuple(cols))
     vol_i = idx.get("VOLUME")
     if vol_i is None:
         return None
@@ -883,7 +1173,7 @@ async def get_stock_avg_daily_volume(
 
 async def _load_board_shortnames(session: aiohttp.ClientSession, boardid: str) -> dict[str, str]:
     boardid_norm = _norm_boardid(boardid, "TQBR") or "TQBR"
-    path = f"/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities.json"
+    path = _shares_board_path(boardid_norm)
     params = {
         "iss.meta": "off",
         "securities.columns": "SECID,SHORTNAME,NAME",
@@ -894,7 +1184,7 @@ async def _load_board_shortnames(session: aiohttp.ClientSession, boardid: str) -
     rows = sec.get("data", [])
     if not rows:
         return {}
-    idx = {str(c).upper(): i for i, c in enumerate(cols)}
+    idx = _col_index(tuple(cols))
     secid_i = idx.get("SECID")
     short_i = idx.get("SHORTNAME")
     name_i = idx.get("NAME")
@@ -920,9 +1210,104 @@ def _history_path_by_asset_type(secid: str, boardid: str | None, asset_type: str
     secid_norm = _norm_secid(secid)
     if asset_type == ASSET_TYPE_METAL:
         boardid_norm = _norm_boardid(boardid, "CETS") or "CETS"
-        return f"/history/engines/currency/markets/selt/boards/{_board_for_path(boardid_norm, 'CETS')}/securities/{secid_norm}.json"
+        return _selt_security_path(boardid_norm, secid_norm, history=True)
     boardid_norm = _norm_boardid(boardid, "TQBR") or "TQBR"
-    return f"/history/engines/stock/markets/shares/boards/{_board_for_path(boardid_norm, 'TQBR')}/securities/{secid_norm}.json"
+    return _shares_security_path(boardid_norm, secid_norm, history=True)
+
+def _parse_cursor(data: dict, block: str) -> tuple[int, int] | None:
+    """
+    Читает блок *.cursor (INDEX, TOTAL, PAGESIZE) и возвращает (TOTAL, PAGESIZE).
+    """
+    cursor = data.get(block, {})
+    cols = cursor.get("columns", [])
+    rows = cursor.get("data", [])
+    if not rows:
+        return None
+    idx = _col_index(tuple(cols))
+    try:
+        total = int(rows[0][idx["TOTAL"]])
+        page_size = int(rows[0][idx["PAGESIZE"]])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    if page_size <= 0:
+        return None
+    return total, page_size
+
+
+async def _fetch_history_pages(
+    session: aiohttp.ClientSession,
+    path: str,
+    base_params: dict,
+    label: str,
+) -> list[dict]:
+    """
+    Загружает все страницы history-эндпоинта ISS/ALGOPACK.
+    Первая страница отдаёт history.cursor (TOTAL, PAGESIZE), остальные запрашиваются параллельно.
+    """
+    use_iss_only = False
+
+    async def fetch_page(start: int) -> dict:
+        # Each page gets its own params dict: pages run concurrently and the in-flight key is built from params.
+        params = {**base_params, "start": start}
+        if use_iss_only:
+            return await iss_get_json(session, path, params=params)
+        data, _ = await get_json_with_fallback_source(session, path, params=params)
+        return data
+
+    data, use_iss_only = await _fetch_with_iss_retry(session, path, {**base_params, "start": 0}, _with_history, label)
+    if data is None:
+        return []
+    rows = data["history"]["data"]
+    pages = [data]
+
+    start = len(rows)
+    cursor = _parse_cursor(data, "history.cursor") if start >= 100 else None
+    if cursor is not None:
+        # _moex_http_sem and the rate limiter still bound how many pages are in flight.
+        total, page_size = cursor
+        pages.extend(await asyncio.gather(*(fetch_page(offset) for offset in range(start, total, page_size))))
+    else:
+        while len(rows) >= 100:
+            page = await fetch_page(start)
+            pages.append(page)
+            rows = page.get("history", {}).get("data", [])
+            start += len(rows)
+    return pages
+
+
+@lru_cache(maxsize=4096)
+def _parse_trade_date(raw: str) -> date:
+    # Instruments share trading days, so the same TRADEDATE strings recur across
+    # every history request; invalid values raise and are not cached.
+    return date.fromisoformat(raw)
+
+
+def _parse_history_rows(hist: dict) -> list[tuple[date, float]]:
+    cols = hist.get("columns", [])
+    rows = hist.get("data", [])
+    idx = _col_index(tuple(cols))
+    dt_i = idx.get("TRADEDATE")
+    if dt_i is None:
+        return []
+    # Price priority CLOSE -> LEGALCLOSEPRICE -> WAPRICE; absent columns are dropped once per page.
+    price_idxs = tuple(i for i in (idx.get("CLOSE"), idx.get("LEGALCLOSEPRICE"), idx.get("WAPRICE")) if i is not None)
+
+    out: list[tuple[date, float]] = []
+    for row in rows:
+        dt_raw = row[dt_i]
+        if not dt_raw:
+            continue
+        n = len(row)
+        px = next((row[i] for i in price_idxs if i < n and row[i] is not None), None)
+        if px is None:
+            continue
+        try:
+            trade_day = _parse_trade_date(str(dt_raw))
+            out.append((trade_day, float(px)))
+        except (TypeError, ValueError):
+            continue
+    return out
+
 
 async def get_history_prices_by_asset_type(
     session: aiohttp.ClientSession,
@@ -937,72 +1322,49 @@ async def get_history_prices_by_asset_type(
     Для цены берется приоритет: CLOSE -> LEGALCLOSEPRICE -> WAPRICE.
     """
     path = _history_path_by_asset_type(secid, boardid, asset_type)
-    start = 0
-    out: list[tuple[date, float]] = []
-    use_iss_only = False
-
-    while True:
-        params = {
-            "iss.meta": "off",
-            "from": from_date.isoformat(),
-            "till": till_date.isoformat(),
-            "start": start,
-            "history.columns": "TRADEDATE,CLOSE,LEGALCLOSEPRICE,WAPRICE",
-        }
-        if use_iss_only:
-            data = await iss_get_json(session, path, params=params)
-            delayed = True
-        else:
-            data, delayed = await get_json_with_fallback_source(session, path, params=params)
-            if delayed:
-                use_iss_only = True
-        hist = data.get("history", {})
-        cols = hist.get("columns", [])
-        rows = hist.get("data", [])
-        if not rows and start == 0 and not delayed:
-            logger.warning("ALGOPACK history response is empty for secid=%s; retry via ISS", secid)
-            mark_delayed_data_used()
-            data = await iss_get_json(session, path, params=params)
-            use_iss_only = True
-            hist = data.get("history", {})
-            cols = hist.get("columns", [])
-            rows = hist.get("data", [])
-        if not rows:
-            break
+    base_params = {
+        "iss.meta": "off",
+        "from": from_date.isoformat(),
+        "till": till_date.isoformat(),
+        "history.columns": "TRADEDATE,CLOSE,LEGALCLOSEPRICE,WAPRICE",
+    }
+    pages = await _fetch_history_pages(session, path, base_params, "history")
+    out = [point for page in pages for point in _parse_history_rows(page.get("history", {}))]
 
-        idx = {str(c).upper(): i for i, c in enumerate(cols)}
-        dt_i = idx.get("TRADEDATE")
-        close_i = idx.get("CLOSE")
-        legal_i = idx.get("LEGALCLOSEPRICE")
-        wap_i = idx.get("WAPRICE")
-        if dt_i is None:
-            break
+    # Pages arrive in date order, so this is a near-linear timsort pass over sorted runs.
+    out.sort(key=itemgetter(0))
+    return out
 
-        for row in rows:
-            dt_raw = row[dt_i]
-            if not dt_raw:
-                continue
-            px = None
-            if close_i is not None and close_i < len(row):
-                px = row[close_i]
-            if px is None and legal_i is not None and legal_i < len(row):
-                px = row[legal_i]
-            if px is None and wap_i is not None and wap_i < len(row):
-                px = row[wap_i]
-            if px is None:
-                continue
-            try:
-                trade_day = date.fromisoformat(str(dt_raw))
-                out.append((trade_day, float(px)))
-            except (TypeError, ValueError):
-                continue
 
-        if len(rows) < 100:
+def _parse_index_history_rows(hist: dict) -> list[tuple[date, float]]:
+    cols = hist.get("columns", [])
+    rows = hist.get("data", [])
+    idx = _col_index(tuple(cols))
+    dt_i = idx.get("TRADEDATE")
+    if dt_i is None:
+        return []
+    price_i = None
+    for candidate in ("CLOSE", "CLOSEVALUE", "LEGALCLOSEPRICE", "CURRENTVALUE", "WAPRICE"):
+        found = idx.get(candidate)
+        if found is not None:
+            price_i = found
             break
-        start += len(rows)
+    if price_i is None:
+        return []
 
-    out.sort(key=lambda x: x[0])
-    return out
+    points: list[tuple[date, float]] = []
+    for row in rows:
+        if dt_i >= len(row) or price_i >= len(row):
+            continue
+        dt_raw = row[dt_i]
+        px_raw = row[price_i]
+        if not dt_raw or px_raw is None:
+            continue
+        try:
+            points.append((_parse_trade_date(str(dt_raw)), float(px_raw)))
+        except (TypeError, ValueError):
+            continue
+    return points
 
 
 async def get_moex_index_return_percent(
@@ -1015,72 +1377,18 @@ async def get_moex_index_return_percent(
     Доходность индекса MOEX за период [from_date, till_date] в процентах.
     """
     path = f"/history/engines/stock/markets/index/securities/{secid}.json"
-    start = 0
-    points: list[tuple[date, float]] = []
-    use_iss_only = False
-
-    while True:
-        params = {
-            "iss.meta": "off",
-            "from": from_date.isoformat(),
-            "till": till_date.isoformat(),
-            "start": start,
-        }
-        if use_iss_only:
-            data = await iss_get_json(session, path, params=params)
-            delayed = True
-        else:
-            data, delayed = await get_json_with_fallback_source(session, path, params=params)
-            if delayed:
-                use_iss_only = True
-
-        hist = data.get("history", {})
-        cols = hist.get("columns", [])
-        rows = hist.get("data", [])
-        if not rows and start == 0 and not delayed:
-            logger.warning("ALGOPACK index history is empty for secid=%s; retry via ISS", secid)
-            mark_delayed_data_used()
-            data = await iss_get_json(session, path, params=params)
-            use_iss_only = True
-            hist = data.get("history", {})
-            cols = hist.get("columns", [])
-            rows = hist.get("data", [])
-        if not rows:
-            break
-
-        idx = {str(c).upper(): i for i, c in enumerate(cols)}
-        dt_i = idx.get("TRADEDATE")
-        if dt_i is None:
-            break
-        price_i = None
-        for candidate in ("CLOSE", "CLOSEVALUE", "LEGALCLOSEPRICE", "CURRENTVALUE", "WAPRICE"):
-            found = idx.get(candidate)
-            if found is not None:
-                price_i = found
-                break
-        if price_i is None:
-            break
-
-        for row in rows:
-            if dt_i >= len(row) or price_i >= len(row):
-                continue
-            dt_raw = row[dt_i]
-            px_raw = row[price_i]
-            if not dt_raw or px_raw is None:
-                continue
-            try:
-                points.append((date.fromisoformat(str(dt_raw)), float(px_raw)))
-            except (TypeError, ValueError):
-                continue
-
-        if len(rows) < 100:
-            break
-        start += len(rows)
+    base_params = {
+        "iss.meta": "off",
+        "from": from_date.isoformat(),
+        "till": till_date.isoformat(),
+    }
+    pages = await _fetch_history_pages(session, path, base_params, "index history")
+    points = [point for page in pages for point in _parse_index_history_rows(page.get("history", {}))]
 
     if len(points) < 2:
         return None
 
-    points.sort(key=lambda x: x[0])
+    points.sort(key=itemgetter(0))
     first = float(points[0][1])
     last = float(points[-1][1])
     if first <= 0:
@@ -1094,29 +1402,36 @@ def _parse_securities_rows(data: dict) -> list[dict]:
     if not rows:
         return []
 
-    idx = {str(c).upper(): i for i, c in enumerate(cols)}
+    idx = _col_index(tuple(cols))
+    # Resolve column positions once per response rather than per row and field.
+    secid_i = idx.get("SECID")
+    shortname_i = idx.get("SHORTNAME")
+    name_i = idx.get("NAME")
+    isin_i = idx.get("ISIN")
+    board_i = idx.get("PRIMARYBOARDID")
+    board_alt_i = idx.get("PRIMARY_BOARDID")
+    traded_i = idx.get("IS_TRADED")
+    group_i = idx.get("GROUP")
 
-    def get(row: list, name: str):
-        i = idx.get(name.upper())
+    def get(row: list, i: int | None):
         return row[i] if i is not None and i < len(row) else None
 
-    out = []
-    for r in rows[:50]:
-        out.append(
-            {
-                "secid": get(r, "SECID"),
-                "shortname": get(r, "SHORTNAME"),
-                "name": get(r, "NAME"),
-                "isin": get(r, "ISIN"),
-                "boardid": get(r, "PRIMARYBOARDID") or get(r, "PRIMARY_BOARDID"),
-                "is_traded": get(r, "IS_TRADED"),
-                "group": get(r, "GROUP"),
-            }
-        )
+    # Deduplicate by (secid, boardid) while building; a later duplicate replaces the earlier row.
     uniq: dict[tuple[str, str | None], dict] = {}
-    for x in out:
-        if x.get("secid"):
-            uniq[(x["secid"], x.get("boardid"))] = x
+    for r in rows[:50]:
+        secid = get(r, secid_i)
+        if not secid:
+            continue
+        boardid = get(r, board_i) or get(r, board_alt_i)
+        uniq[(secid, boardid)] = {
+            "secid": secid,
+            "shortname": get(r, shortname_i),
+            "name": get(r, name_i),
+            "isin": get(r, isin_i),
+            "boardid": boardid,
+            "is_traded": get(r, traded_i),
+            "group": get(r, group_i),
+        }
     return list(uniq.values())
 
 def _rank_by_query(items: list[dict], query: str) -> list[dict]:
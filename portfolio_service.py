@@ -12,7 +12,13 @@ from db import (
     list_active_position_instruments,
     upsert_price_cache_bulk,
 )
-from moex_iss import ASSET_TYPE_STOCK, get_history_prices_by_asset_type, get_last_price_by_asset_type
+from moex_iss import (
+    ASSET_TYPE_STOCK,
+    get_history_prices_by_asset_type,
+    get_last_price_by_asset_type,
+    get_last_prices_bulk,
+    moex_session,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +44,25 @@ async def fetch_prices_limited(
     sem = asyncio.Semaphore(price_fetch_concurrency)
     out: list[tuple[dict, float | None]] = []
 
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
+        # Stocks are priced per board in bulk first, so the per-row lookups below
+        # mostly hit the MOEX last-price cache.
+        boards: dict[str, list[str]] = {}
+        for row in rows:
+            if (row.get("asset_type") or ASSET_TYPE_STOCK) == ASSET_TYPE_STOCK:
+                boards.setdefault(row.get("boardid") or "", []).append(row["secid"])
+
+        async def load_board(boardid: str, secids: list[str]) -> None:
+            async with sem:
+                try:
+                    await get_last_prices_bulk(session, secids, boardid or None)
+                except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError):
+                    logger.warning("Failed to bulk load prices boardid=%s", boardid)
+
+        await asyncio.gather(
+            *(load_board(boardid, secids) for boardid, secids in boards.items() if len(secids) > 1)
+        )
+
         async def load_price(row: dict) -> tuple[dict, float | None]:
             async with sem:
                 try:
@@ -190,7 +214,7 @@ async def compute_portfolio_return_30d(
     sem = asyncio.Semaphore(price_fetch_concurrency)
     base_price_map: dict[int, float] = {}
 
-    async with aiohttp.ClientSession() as session:
+    async with moex_session() as session:
         async def load_base(row: dict) -> None:
             async with sem:
                 try:
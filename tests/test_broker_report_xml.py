@@ -0,0 +1,57 @@
+import unittest
+
+from broker_report_xml import parse_broker_report_xml
+
+_REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<report_broker>
+  <trades_finished>
+    <trade>
+      <trade_no>2</trade_no>
+      <db_time>2026-01-29T13:24:48</db_time>
+      <isin_reg>gld</isin_reg>
+      <p_name>Золото</p_name>
+      <qty>1,5</qty>
+      <Price>7000</Price>
+      <bank_tax>-1</bank_tax>
+    </trade>
+    <trade>
+      <trade_no>1</trade_no>
+      <db_time>2026-01-28T10:00:00</db_time>
+      <isin_reg>RU0009029540</isin_reg>
+      <p_name>Сбербанк</p_name>
+      <qty>10</qty>
+      <Price>300.5</Price>
+      <bank_tax>0.15</bank_tax>
+    </trade>
+  </trades_finished>
+</report_broker>
+"""
+
+
+class ParseBrokerReportXmlTests(unittest.TestCase):
+    def test_parses_utf8_report_with_bom(self):
+        for data in (_REPORT.encode("utf-8"), b"\xef\xbb\xbf" + _REPORT.encode("utf-8"), bytearray(_REPORT.encode("utf-8"))):
+            with self.subTest(prefix=bytes(data[:3])):
+                trades = parse_broker_report_xml(data)
+                self.assertEqual([t.trade_no for t in trades], ["1", "2"])
+                self.assertEqual(trades[0].asset_name, "Сбербанк")
+                self.assertEqual(trades[0].trade_date, "28.01.2026")
+                self.assertEqual((trades[1].asset_type, trades[1].metal_secid), ("metal", "GLDRUB_TOM"))
+                self.assertEqual((trades[1].qty, trades[1].commission), (1.5, 0.0))
+
+    def test_non_utf8_upload_is_reported_as_such(self):
+        data = _REPORT.replace(' encoding="UTF-8"', "").encode("cp1251")
+        with self.assertRaisesRegex(ValueError, "Файл не похож на UTF-8 XML выписку"):
+            parse_broker_report_xml(data)
+
+    def test_malformed_xml(self):
+        with self.assertRaisesRegex(ValueError, "Не удалось разобрать XML"):
+            parse_broker_report_xml("<report_broker><trades_finished>".encode("utf-8"))
+
+    def test_unexpected_root_tag(self):
+        with self.assertRaisesRegex(ValueError, "корневой тег не report_broker"):
+            parse_broker_report_xml(b"<report/>")
+
+
+if __name__ == "__main__":
+    unittest.main()
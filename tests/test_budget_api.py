@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import miniapp
+
+
+class _FakeBudgetRepo:
+    def __init__(self):
+        self.funds = {}
+        self.history = []
+        self.incomes = []
+        self.savings = []
+
+    async def list_budget_incomes_with_total(self, db_dsn, user_id):
+        return list(self.incomes), float(sum(x["amount_monthly"] for x in self.incomes))
+
+    async def list_budget_savings_with_total(self, db_dsn, user_id):
+        return list(self.savings), float(sum(x["amount"] for x in self.savings))
+
+    async def increment_budget_fund_saved(self, db_dsn, user_id, fund_id, delta):
+        fund = self.funds.get(fund_id)
+        if not fund or fund["user_id"] != user_id or fund["status"] == "deleted":
+            return None
+        fund["already_saved"] += float(delta)
+        return fund["already_saved"]
+
+    async def add_budget_history_event(self, db_dsn, *, user_id, entity, entity_id, action, payload):
+        self.history.append((entity, entity_id, action, payload))
+
+
+class BudgetApiTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.repo = _FakeBudgetRepo()
+        self.app = web.Application()
+        miniapp.attach_miniapp_routes(self.app, db_dsn="fake", bot_token="fake")
+        self.server = TestServer(self.app)
+        self.client = TestClient(self.server)
+
+        self.patches = [
+            patch.object(miniapp, "_auth_user_id", autospec=True, return_value=777),
+            patch.object(
+                miniapp,
+                "increment_budget_fund_saved",
+                autospec=True,
+                side_effect=self.repo.increment_budget_fund_saved,
+            ),
+            patch.object(
+                miniapp,
+                "add_budget_history_event",
+                autospec=True,
+                side_effect=self.repo.add_budget_history_event,
+            ),
+            patch.object(
+                miniapp,
+                "list_budget_incomes_with_total",
+                autospec=True,
+                side_effect=self.repo.list_budget_incomes_with_total,
+            ),
+            patch.object(
+                miniapp,
+                "list_budget_savings_with_total",
+                autospec=True,
+                side_effect=self.repo.list_budget_savings_with_total,
+            ),
+        ]
+        for p in self.patches:
+            p.start()
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        for p in reversed(self.patches):
+            p.stop()
+
+    async def test_fund_topup(self):
+        self.repo.funds[5] = {"user_id": 777, "already_saved": 100.0, "status": "active"}
+        resp = await self.client.post("/api/miniapp/budget/funds/5", json={"action": "topup", "amount": "1 000,50"})
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(self.repo.funds[5]["already_saved"], 1100.5)
+        self.assertEqual(self.repo.history, [("goal", 5, "topup", {"amount": 1000.5})])
+
+    async def test_fund_topup_missing_or_deleted_fund_is_404(self):
+        self.repo.funds[6] = {"user_id": 777, "already_saved": 0.0, "status": "deleted"}
+        self.repo.funds[7] = {"user_id": 778, "already_saved": 0.0, "status": "active"}
+        for fund_id in (5, 6, 7):
+            resp = await self.client.post(f"/api/miniapp/budget/funds/{fund_id}", json={"action": "topup", "amount": "10"})
+            self.assertEqual(resp.status, 404)
+            self.assertEqual(await resp.text(), "fund not found")
+        self.assertEqual(self.repo.history, [])
+
+    async def test_incomes_and_savings_empty_total(self):
+        for path in ("/api/miniapp/budget/incomes", "/api/miniapp/budget/savings"):
+            resp = await self.client.get(path)
+            self.assertEqual(resp.status, 200)
+            data = (await resp.json())["data"]
+            self.assertEqual(data, {"items": [], "total": 0.0})
+
+    async def test_incomes_and_savings_total(self):
+        self.repo.incomes = [
+            {"id": 2, "kind": "other", "title": "Rent", "amount_monthly": 25000.5},
+            {"id": 1, "kind": "salary", "title": "Salary", "amount_monthly": 150000.0},
+        ]
+        self.repo.savings = [{"id": 3, "kind": "cash", "title": "Cash", "amount": 1500.25}]
+
+        data = (await (await self.client.get("/api/miniapp/budget/incomes")).json())["data"]
+        self.assertEqual([x["id"] for x in data["items"]], [2, 1])
+        self.assertEqual(data["total"], 175000.5)
+
+        data = (await (await self.client.get("/api/miniapp/budget/savings")).json())["data"]
+        self.assertEqual(data, {"items": self.repo.savings, "total": 1500.25})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import time
+import unittest
+
+import asyncpg
+from dotenv import load_dotenv
+
+from db import (
+    add_budget_income,
+    add_budget_saving,
+    close_pools,
+    create_budget_fund,
+    disable_budget_income,
+    disable_budget_saving,
+    increment_budget_fund_saved,
+    init_db,
+    list_budget_funds,
+    list_budget_incomes,
+    list_budget_incomes_with_total,
+    list_budget_savings,
+    list_budget_savings_with_total,
+    update_budget_fund,
+)
+
+
+class BudgetDbIntegrationTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        load_dotenv()
+        self.db_dsn = (
+            os.getenv("TEST_DATABASE_URL")
+            or os.getenv("DATABASE_URL")
+            or os.getenv("DB_DSN")
+            or ""
+        ).strip()
+        if not self.db_dsn:
+            self.skipTest("DATABASE_URL/TEST_DATABASE_URL/DB_DSN is not set")
+
+        self.user_id = int(f"95{int(time.time() * 1000) % 10**11:011d}")
+        self.other_user_id = self.user_id + 1
+        await init_db(self.db_dsn)
+
+    async def asyncTearDown(self):
+        if not self.db_dsn:
+            return
+        conn = await asyncpg.connect(dsn=self.db_dsn)
+        try:
+            for user_id in (self.user_id, self.other_user_id):
+                await conn.execute("DELETE FROM users WHERE telegram_user_id = $1", user_id)
+        finally:
+            await conn.close()
+        await close_pools()
+
+    async def _create_fund(self, already_saved: float = 100.0) -> int:
+        return await create_budget_fund(
+            self.db_dsn,
+            user_id=self.user_id,
+            title="Integration Fund",
+            target_amount=1000.0,
+            already_saved=already_saved,
+            target_month="2027-01",
+            priority="medium",
+        )
+
+    async def test_increment_budget_fund_saved(self):
+        fund_id = await self._create_fund()
+        self.assertEqual(await increment_budget_fund_saved(self.db_dsn, self.user_id, fund_id, 50.5), 150.5)
+        self.assertEqual(await increment_budget_fund_saved(self.db_dsn, self.user_id, fund_id, 9.5), 160.0)
+        funds = await list_budget_funds(self.db_dsn, self.user_id)
+        self.assertEqual([f["already_saved"] for f in funds if f["id"] == fund_id], [160.0])
+
+    async def test_increment_missing_foreign_or_deleted_fund_returns_none(self):
+        fund_id = await self._create_fund()
+        self.assertIsNone(await increment_budget_fund_saved(self.db_dsn, self.user_id, fund_id + 10**9, 10.0))
+        self.assertIsNone(await increment_budget_fund_saved(self.db_dsn, self.other_user_id, fund_id, 10.0))
+
+        self.assertTrue(await update_budget_fund(self.db_dsn, user_id=self.user_id, fund_id=fund_id, status="deleted"))
+        self.assertIsNone(await increment_budget_fund_saved(self.db_dsn, self.user_id, fund_id, 10.0))
+
+        conn = await asyncpg.connect(dsn=self.db_dsn)
+        try:
+            saved = await conn.fetchval("SELECT already_saved FROM budget_funds WHERE id = $1", fund_id)
+        finally:
+            await conn.close()
+        self.assertEqual(saved, 100.0)
+
+    async def test_incomes_and_savings_with_total_when_empty(self):
+        self.assertEqual(await list_budget_incomes_with_total(self.db_dsn, self.user_id), ([], 0.0))
+        self.assertEqual(await list_budget_savings_with_total(self.db_dsn, self.user_id), ([], 0.0))
+
+    async def test_incomes_with_total_matches_plain_list(self):
+        await add_budget_income(self.db_dsn, self.user_id, kind="salary", title="Salary", amount_monthly=150000.0)
+        await add_budget_income(self.db_dsn, self.user_id, kind="other", title="Rent", amount_monthly=25000.5)
+        dropped = await add_budget_income(self.db_dsn, self.user_id, kind="other", title="Old", amount_monthly=999.0)
+        await add_budget_income(self.db_dsn, self.other_user_id, kind="salary", title="Foreign", amount_monthly=1.0)
+        self.assertTrue(await disable_budget_income(self.db_dsn, self.user_id, dropped))
+
+        items, total = await list_budget_incomes_with_total(self.db_dsn, self.user_id)
+        self.assertEqual(items, await list_budget_incomes(self.db_dsn, self.user_id))
+        self.assertEqual([x["title"] for x in items], ["Rent", "Salary"])
+        self.assertAlmostEqual(total, 175000.5)
+
+    async def test_savings_with_total_matches_plain_list(self):
+        await add_budget_saving(self.db_dsn, self.user_id, kind="deposit", title="Deposit", amount=300000.0)
+        await add_budget_saving(self.db_dsn, self.user_id, kind="cash", title="Cash", amount=1500.25)
+        dropped = await add_budget_saving(self.db_dsn, self.user_id, kind="cash", title="Old", amount=10.0)
+        self.assertTrue(await disable_budget_saving(self.db_dsn, self.user_id, dropped))
+
+        items, total = await list_budget_savings_with_total(self.db_dsn, self.user_id)
+        self.assertEqual(items, await list_budget_savings(self.db_dsn, self.user_id))
+        self.assertEqual([x["title"] for x in items], ["Cash", "Deposit"])
+        self.assertAlmostEqual(total, 301500.25)
+
+        self.assertEqual(await list_budget_savings_with_total(self.db_dsn, self.other_user_id), ([], 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
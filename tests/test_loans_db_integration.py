@@ -8,6 +8,7 @@ import asyncpg
 from dotenv import load_dotenv
 
 from db import (
+    close_pools,
     create_loan_account,
     create_loan_event,
     get_loan_account,
@@ -46,6 +47,8 @@ class LoansDbIntegrationTests(unittest.IsolatedAsyncioTestCase):
             await conn.execute("DELETE FROM users WHERE telegram_user_id = $1", self.other_user_id)
         finally:
             await conn.close()
+        # Pools are cached per DSN, and every test runs on its own event loop.
+        await close_pools()
 
     async def test_create_list_get_and_event_idempotency_with_cache_invalidation(self):
         loan_id = await create_loan_account(
@@ -27,6 +27,27 @@ class MiniAppAuthTests(unittest.TestCase):
         user = parse_and_validate_init_data(token, init_data)
         self.assertEqual(user["id"], 777)
 
+    def test_validate_init_data_decodes_escaped_user(self):
+        token = "123456:ABCDEF"
+        init_data = make_init_data(token, {"id": 777, "first_name": "Иван Петров", "username": "a+b&c"})
+        user = parse_and_validate_init_data(token, init_data)
+        self.assertEqual(user["first_name"], "Иван Петров")
+        self.assertEqual(user["username"], "a+b&c")
+
+    def test_validate_init_data_unknown_field(self):
+        token = "123456:ABCDEF"
+        fields = {
+            "auth_date": str(int(time.time())),
+            "future_field": "x",
+            "query_id": "AAEAAAE",
+            "user": json.dumps({"id": 777}, separators=(",", ":")),
+        }
+        data_check = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+        secret_key = hmac.new(b"WebAppData", token.encode("utf-8"), hashlib.sha256).digest()
+        fields["hash"] = hmac.new(secret_key, data_check.encode("utf-8"), hashlib.sha256).hexdigest()
+        user = parse_and_validate_init_data(token, urlencode(fields))
+        self.assertEqual(user["id"], 777)
+
     def test_validate_init_data_bad_hash(self):
         token = "123456:ABCDEF"
         init_data = make_init_data(token, {"id": 777}) + "x"
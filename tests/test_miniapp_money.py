@@ -0,0 +1,57 @@
+import unittest
+
+import miniapp
+
+
+class ParseMoneyTextTests(unittest.TestCase):
+    def test_accepted_inputs(self):
+        cases = [
+            ("5", 5.0),
+            ("5млн", 5_000_000.0),
+            ("5 млн", 5_000_000.0),
+            ("5м", 5_000_000.0),
+            ("5m", 5_000_000.0),
+            ("5M", 5_000_000.0),
+            ("5ммлн", 5_000_000.0),
+            ("5мm", 5_000_000.0),
+            ("1,5млн", 1_500_000.0),
+            ("1 000,50", 1000.5),
+            ("1_000.50 ₽", 1000.5),
+            (" 250 ", 250.0),
+            (12, 12.0),
+            (0.5, 0.5),
+        ]
+        for raw, expected in cases:
+            with self.subTest(raw=raw):
+                self.assertEqual(miniapp._parse_money_text(raw), expected)
+
+    def test_rejected_inputs(self):
+        cases = [
+            None,
+            "",
+            "млн",
+            "м",
+            "5млнм",
+            "6mм",
+            "5mm",
+            "5ммм",
+            "5k",
+            "5 руб",
+            "abc",
+            "0",
+            "-5",
+            "0млн",
+            0,
+        ]
+        for raw in cases:
+            with self.subTest(raw=raw):
+                with self.assertRaises(ValueError):
+                    miniapp._parse_money_text(raw)
+
+    def test_safe_money(self):
+        self.assertEqual(miniapp._safe_money("2м"), 2_000_000.0)
+        self.assertIsNone(miniapp._safe_money("5млнм"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import time
+import unittest
+
+import aiohttp
+
+import miniapp
+
+
+class QuoteCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        miniapp._api_cache.clear()
+        miniapp._inflight.clear()
+        miniapp._background_tasks.clear()
+        self.key = ("price", "stock", "SBER", "")
+        self.calls = 0
+
+    def tearDown(self):
+        miniapp._api_cache.clear()
+        miniapp._inflight.clear()
+
+    async def _fetch_ok(self) -> float:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return 100.0 + self.calls
+
+    async def _fetch_fail(self) -> float:
+        self.calls += 1
+        raise aiohttp.ClientError("upstream down")
+
+    @staticmethod
+    def _build(price):
+        return {"price": price}
+
+    def _age_entry(self, age: float) -> None:
+        _, data = miniapp._api_cache[self.key]
+        miniapp._api_cache[self.key] = (time.monotonic() + miniapp._API_CACHE_TTL_SEC - age, data)
+
+    async def _drain_background(self) -> None:
+        while miniapp._background_tasks:
+            await asyncio.gather(*list(miniapp._background_tasks))
+
+    async def test_miss_fetches_and_young_hit_is_served_from_cache(self):
+        first = await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        second = await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        self.assertEqual(first, {"price": 101.0})
+        self.assertEqual(second, {"price": 101.0})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(miniapp._background_tasks, set())
+
+    async def test_miss_with_failed_fetch_is_not_cached(self):
+        with self.assertLogs(miniapp.logger, "WARNING"):
+            payload = await miniapp._cached_quote(self.key, self._fetch_fail, self._build, "test")
+        self.assertEqual(payload, {"price": None})
+        self.assertNotIn(self.key, miniapp._api_cache)
+
+    async def test_old_hit_is_refreshing_not_stale_and_refreshes_once(self):
+        await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        self._age_entry(miniapp._API_CACHE_REFRESH_AFTER_SEC + 1)
+
+        first = await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        second = await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        self.assertEqual(first, {"price": 101.0, "refreshing": True})
+        self.assertEqual(second, {"price": 101.0, "refreshing": True})
+        # The pending task holds a strong reference until it finishes.
+        self.assertEqual(len(miniapp._background_tasks), 1)
+
+        await self._drain_background()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(miniapp._background_tasks, set())
+        fresh = await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        self.assertEqual(fresh, {"price": 102.0})
+
+    async def test_failed_refresh_is_logged_and_marks_entry_stale(self):
+        await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        self._age_entry(miniapp._API_CACHE_REFRESH_AFTER_SEC + 1)
+
+        with self.assertLogs(miniapp.logger, "WARNING") as logs:
+            payload = await miniapp._cached_quote(self.key, self._fetch_fail, self._build, "test")
+            await self._drain_background()
+        self.assertEqual(payload, {"price": 101.0, "refreshing": True})
+        self.assertIn("refresh failed", logs.output[0])
+
+        served = await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test")
+        self.assertEqual(served, {"price": 101.0, "stale": True, "refreshing": True})
+        await self._drain_background()
+        self.assertEqual(await miniapp._cached_quote(self.key, self._fetch_ok, self._build, "test"), {"price": 103.0})
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        miniapp._inflight.clear()
+
+    async def test_concurrent_callers_share_one_fetch(self):
+        calls = 0
+        release = asyncio.Event()
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "value"
+
+        waiters = [asyncio.ensure_future(miniapp._single_flight(("k",), fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.assertIn(("k",), miniapp._inflight)
+        release.set()
+        self.assertEqual(await asyncio.gather(*waiters), ["value"] * 3)
+        self.assertEqual(calls, 1)
+        self.assertNotIn(("k",), miniapp._inflight)
+
+    async def test_cancelled_waiter_does_not_cancel_shared_fetch(self):
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "value"
+
+        first = asyncio.ensure_future(miniapp._single_flight(("k",), fetch))
+        second = asyncio.ensure_future(miniapp._single_flight(("k",), fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        self.assertEqual(await second, "value")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+
+    async def test_failure_is_shared_and_key_is_released(self):
+        async def fetch():
+            raise aiohttp.ClientError("boom")
+
+        results = await asyncio.gather(
+            miniapp._single_flight(("k",), fetch),
+            miniapp._single_flight(("k",), fetch),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, aiohttp.ClientError) for r in results))
+        self.assertNotIn(("k",), miniapp._inflight)
+
+
+if __name__ == "__main__":
+    unittest.main()
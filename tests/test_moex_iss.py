@@ -0,0 +1,297 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import aiohttp
+import orjson
+
+import moex_iss
+
+
+class HedgedFallbackTests(unittest.IsolatedAsyncioTestCase):
+    async def test_hedge_failure_does_not_retry_iss_again(self):
+        calls = {"algo": 0, "iss": 0}
+
+        async def slow_failing_algopack(session, path, params=None):
+            calls["algo"] += 1
+            await asyncio.sleep(0.05)
+            raise aiohttp.ClientError("algopack down")
+
+        async def failing_iss(session, path, params=None):
+            calls["iss"] += 1
+            raise aiohttp.ClientError("iss down")
+
+        moex_iss.reset_data_source_flags()
+        with (
+            patch.object(moex_iss, "_get_algopack_api_key", return_value="token"),
+            patch.object(moex_iss, "ALGOPACK_HEDGE_DELAY_SEC", 0.01),
+            patch.object(moex_iss, "algopack_get_json", side_effect=slow_failing_algopack),
+            patch.object(moex_iss, "iss_get_json", side_effect=failing_iss),
+        ):
+            with self.assertRaises(aiohttp.ClientError):
+                await moex_iss.get_json_with_fallback_source(None, "/x.json")
+        self.assertEqual(calls, {"algo": 1, "iss": 1})
+        self.assertTrue(moex_iss.delayed_data_used())
+
+    async def test_hedge_returns_iss_when_algopack_is_slow(self):
+        async def slow_algopack(session, path, params=None):
+            await asyncio.sleep(1)
+            return {"source": "algo"}
+
+        async def fast_iss(session, path, params=None):
+            return {"source": "iss"}
+
+        with (
+            patch.object(moex_iss, "_get_algopack_api_key", return_value="token"),
+            patch.object(moex_iss, "ALGOPACK_HEDGE_DELAY_SEC", 0.01),
+            patch.object(moex_iss, "algopack_get_json", side_effect=slow_algopack),
+            patch.object(moex_iss, "iss_get_json", side_effect=fast_iss),
+        ):
+            data, delayed = await moex_iss.get_json_with_fallback_source(None, "/x.json")
+        self.assertEqual(data, {"source": "iss"})
+        self.assertTrue(delayed)
+
+    async def test_fast_algopack_failure_falls_back_to_iss_once(self):
+        calls = {"iss": 0}
+
+        async def failing_algopack(session, path, params=None):
+            raise aiohttp.ClientError("algopack down")
+
+        async def iss(session, path, params=None):
+            calls["iss"] += 1
+            return {"source": "iss"}
+
+        with (
+            patch.object(moex_iss, "_get_algopack_api_key", return_value="token"),
+            patch.object(moex_iss, "ALGOPACK_HEDGE_DELAY_SEC", 1.0),
+            patch.object(moex_iss, "algopack_get_json", side_effect=failing_algopack),
+            patch.object(moex_iss, "iss_get_json", side_effect=iss),
+        ):
+            data, delayed = await moex_iss.get_json_with_fallback_source(None, "/x.json")
+        self.assertEqual(data, {"source": "iss"})
+        self.assertTrue(delayed)
+        self.assertEqual(calls["iss"], 1)
+
+
+class TokenBucketTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.now = 100.0
+        self.sleeps: list[float] = []
+
+        async def fake_sleep(delay):
+            self.sleeps.append(delay)
+            self.now += delay
+
+        # Only moex_iss sees the fake clock; the test's own event loop keeps real time.
+        fake_loop = SimpleNamespace(time=lambda: self.now)
+        fake_asyncio = SimpleNamespace(
+            Lock=asyncio.Lock,
+            get_running_loop=lambda: fake_loop,
+            sleep=fake_sleep,
+        )
+        self.patcher = patch.object(moex_iss, "asyncio", fake_asyncio)
+        self.patcher.start()
+
+    async def asyncTearDown(self):
+        self.patcher.stop()
+
+    async def test_burst_is_served_without_waiting(self):
+        bucket = moex_iss._TokenBucket(rate=2.0, burst=3.0)
+        for _ in range(3):
+            await bucket.acquire()
+        self.assertEqual(self.sleeps, [])
+
+    async def test_acquire_waits_for_refill_when_empty(self):
+        bucket = moex_iss._TokenBucket(rate=2.0, burst=1.0)
+        await bucket.acquire()
+        await bucket.acquire()
+        self.assertEqual(self.sleeps, [0.5])
+        self.assertAlmostEqual(self.now, 100.5)
+
+    async def test_refill_is_capped_at_burst(self):
+        bucket = moex_iss._TokenBucket(rate=10.0, burst=2.0)
+        await bucket.acquire()
+        self.now += 60.0
+        for _ in range(2):
+            await bucket.acquire()
+        self.assertEqual(self.sleeps, [])
+        await bucket.acquire()
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertAlmostEqual(self.sleeps[0], 0.1)
+
+    async def test_rate_limit_is_disabled_by_default(self):
+        self.assertEqual(moex_iss.MOEX_HTTP_RATE_PER_SEC, 0.0)
+        moex_iss._moex_rate_limiters.clear()
+        await moex_iss._acquire_rate_limit(moex_iss.ISS_BASE)
+        self.assertEqual(moex_iss._moex_rate_limiters, {})
+
+
+class AlgopackAuthCacheTests(unittest.TestCase):
+    def setUp(self):
+        moex_iss.reset_algopack_auth_cache()
+
+    def tearDown(self):
+        moex_iss.reset_algopack_auth_cache()
+
+    def test_headers_survive_flags_reset_until_explicit_rotation(self):
+        with patch.dict(moex_iss.os.environ, {"ALGOPACK_API_KEY": "old"}):
+            headers = moex_iss._algopack_auth_headers()
+        self.assertEqual(headers, {"Authorization": "Bearer old"})
+
+        with patch.dict(moex_iss.os.environ, {"ALGOPACK_API_KEY": "new"}):
+            moex_iss.reset_data_source_flags()
+            self.assertIs(moex_iss._algopack_auth_headers(), headers)
+            moex_iss.reset_algopack_auth_cache()
+            self.assertEqual(moex_iss._algopack_auth_headers(), {"Authorization": "Bearer new"})
+
+
+class ResponseCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        moex_iss.reset_iss_cache()
+        self.calls = 0
+
+    def tearDown(self):
+        moex_iss.reset_iss_cache()
+
+    async def _fake_fetch(self, session, base, path, params, headers, source_name):
+        self.calls += 1
+        return orjson.dumps({"marketdata": {"columns": ["LAST"], "data": [[100.0 + self.calls]]}})
+
+    def test_ttl_selection(self):
+        today = datetime.now(moex_iss.MSK_TZ).date()
+        past = (today - timedelta(days=1)).isoformat()
+        history = "/history/engines/stock/markets/shares/boards/tqbr/securities/SBER.json"
+        ttl = moex_iss._response_cache_ttl
+        self.assertEqual(ttl(history, {"from": past, "till": past}), moex_iss._ISS_REFERENCE_CACHE_TTL_SEC)
+        self.assertEqual(ttl(history, {"from": past, "till": today.isoformat()}), moex_iss.ISS_RESPONSE_CACHE_TTL_SEC)
+        self.assertEqual(ttl(history, {"from": past}), moex_iss.ISS_RESPONSE_CACHE_TTL_SEC)
+        self.assertEqual(ttl("/securities.json", {"q": "SBER"}), moex_iss._ISS_SEARCH_CACHE_TTL_SEC)
+        board = "/engines/stock/markets/shares/boards/tqbr/securities.json"
+        self.assertEqual(ttl(board, {"securities.columns": "SECID,SHORTNAME"}), moex_iss._ISS_REFERENCE_CACHE_TTL_SEC)
+        self.assertEqual(ttl(board, {"marketdata.columns": "SECID,LAST"}), moex_iss.ISS_RESPONSE_CACHE_TTL_SEC)
+        self.assertEqual(ttl(board + "/SBER.json", {"iss.meta": "off"}), moex_iss.ISS_RESPONSE_CACHE_TTL_SEC)
+
+    async def test_hit_skips_network_and_returns_independent_copies(self):
+        with patch.object(moex_iss, "_fetch_json", side_effect=self._fake_fetch):
+            first = await moex_iss.iss_get_json(None, "/x.json", params={"a": 1})
+            first["marketdata"]["data"].clear()
+            second = await moex_iss.iss_get_json(None, "/x.json", params={"a": "1"})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second["marketdata"]["data"], [[101.0]])
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        with patch.object(moex_iss, "_fetch_json", side_effect=self._fake_fetch):
+            results = await asyncio.gather(*(moex_iss.iss_get_json(None, "/x.json") for _ in range(3)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len({id(r) for r in results}), 3)
+
+    async def test_expired_entry_and_reset_refetch(self):
+        with patch.object(moex_iss, "_fetch_json", side_effect=self._fake_fetch):
+            await moex_iss.iss_get_json(None, "/x.json")
+            key = next(iter(moex_iss._response_cache))
+            moex_iss._response_cache[key] = (time.monotonic() - 1, moex_iss._response_cache[key][1])
+            await moex_iss.iss_get_json(None, "/x.json")
+            self.assertEqual(self.calls, 2)
+
+            # Handlers reset per-request flags on every command; that must not drop the shared cache.
+            moex_iss.reset_data_source_flags()
+            self.assertEqual(len(moex_iss._response_cache), 1)
+            moex_iss.reset_iss_cache()
+            self.assertEqual(len(moex_iss._response_cache), 0)
+            data = await moex_iss.iss_get_json(None, "/x.json")
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(data["marketdata"]["data"], [[103.0]])
+
+
+class LastPricesBulkTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        moex_iss._last_price_cache.clear()
+        self.requests: list[dict] = []
+
+    def tearDown(self):
+        moex_iss._last_price_cache.clear()
+
+    async def _fake_source(self, session, path, params=None):
+        self.requests.append({"path": path, **params})
+        secids = params["securities"].split(",")
+        # Columns deliberately out of the requested order; parsing must go by name.
+        rows = [[None if secid.endswith("9") else float(i), secid] for i, secid in enumerate(secids)]
+        return {"marketdata": {"columns": ["LAST", "SECID"], "data": rows}}, False
+
+    async def test_chunks_by_50_and_dedupes(self):
+        secids = [f"S{i:03d}" for i in range(120)] + ["s000", " S001 ", ""]
+        with patch.object(moex_iss, "get_json_with_fallback_source", side_effect=self._fake_source):
+            prices = await moex_iss.get_last_prices_bulk(None, secids, "TQBR")
+        self.assertEqual([len(r["securities"].split(",")) for r in self.requests], [50, 50, 20])
+        for req in self.requests:
+            self.assertEqual(req["path"], "/engines/stock/markets/shares/boards/tqbr/securities.json")
+            self.assertEqual(req["iss.only"], "marketdata")
+            self.assertEqual(req["marketdata.columns"], "SECID,LAST")
+        # Secids ending in 9 came back without LAST and are left out.
+        self.assertEqual(len(prices), 120 - 12)
+        self.assertEqual(prices["S000"], 0.0)
+        self.assertEqual(prices["S051"], 1.0)
+        self.assertNotIn("S009", prices)
+
+    async def test_fills_last_price_cache(self):
+        with patch.object(moex_iss, "get_json_with_fallback_source", side_effect=self._fake_source):
+            await moex_iss.get_last_prices_bulk(None, ["SBER", "GAZP", "LKOH9"], None)
+        self.assertEqual(moex_iss.get_cached_last_price("SBER", "TQBR", moex_iss.ASSET_TYPE_STOCK), 0.0)
+        self.assertEqual(moex_iss.get_cached_last_price("GAZP", None, moex_iss.ASSET_TYPE_STOCK), 1.0)
+        self.assertIsNone(moex_iss.get_cached_last_price("LKOH9", "TQBR", moex_iss.ASSET_TYPE_STOCK))
+        self.assertIsNone(moex_iss.get_cached_last_price("SBER", "TQTF", moex_iss.ASSET_TYPE_STOCK))
+
+    async def test_missing_columns_yield_no_prices(self):
+        async def no_last(session, path, params=None):
+            return {"marketdata": {"columns": ["SECID"], "data": [["SBER"]]}}, False
+
+        with patch.object(moex_iss, "get_json_with_fallback_source", side_effect=no_last):
+            self.assertEqual(await moex_iss.get_last_prices_bulk(None, ["SBER", "GAZP"]), {})
+
+
+class MoversShortRowTests(unittest.IsolatedAsyncioTestCase):
+    async def test_day_movers_keep_rows_missing_optional_columns(self):
+        async def source(session, path, params=None):
+            return {
+                "securities": {"columns": ["SECID", "SHORTNAME"], "data": [["SBER", "Sber"], ["GAZP"]]},
+                "marketdata": {
+                    "columns": ["SECID", "OPEN", "LAST", "VOLTODAY", "VALTODAY"],
+                    "data": [
+                        ["SBER", 100.0, 110.0, 5.0, 500.0],
+                        ["GAZP", 200.0, 190.0],
+                        ["LKOH", 300.0],
+                    ],
+                },
+            }, False
+
+        with patch.object(moex_iss, "get_json_with_fallback_source", side_effect=source):
+            out = await moex_iss.get_stock_day_movers(None)
+        self.assertEqual(
+            [(x["secid"], x["shortname"], x["pct"], x["vol_today"], x["val_today"]) for x in out],
+            [("SBER", "Sber", 10.0, 5.0, 500.0), ("GAZP", "GAZP", -5.0, None, None)],
+        )
+
+    def test_history_page_keeps_rows_missing_optional_columns(self):
+        page = {
+            "history": {
+                "columns": ["SECID", "OPEN", "VOLUME", "CLOSE", "LEGALCLOSEPRICE", "WAPRICE", "VALUE"],
+                "data": [
+                    ["SBER", 100.0, 7.0, 110.0, 111.0, 112.0, 700.0],
+                    ["GAZP", 200.0, 3.0, None, 210.0],
+                    ["LKOH", 300.0, 1.0, None],
+                    ["NVTK"],
+                ],
+            },
+        }
+        out = moex_iss._parse_history_movers_page(page)
+        self.assertEqual(
+            [(x["secid"], x["last"], x["vol_today"], x["val_today"]) for x in out],
+            [("SBER", 110.0, 7.0, 700.0), ("GAZP", 210.0, 3.0, None)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import aiohttp
+
+import moex_iss
+import portfolio_service
+
+
+class FetchPricesLimitedTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        moex_iss._last_price_cache.clear()
+        self.active = 0
+        self.max_active = 0
+        self.bulk_boards: list[str] = []
+
+    async def asyncTearDown(self):
+        moex_iss._last_price_cache.clear()
+        await moex_iss.close_moex_session()
+
+    async def _fake_source(self, session, path, params=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active -= 1
+        if "securities" not in params:
+            raise aiohttp.ClientError("per-row request not expected")
+        self.bulk_boards.append(path.split("/boards/")[1].split("/")[0])
+        rows = [[secid, 10.0] for secid in params["securities"].split(",")]
+        return {"marketdata": {"columns": ["SECID", "LAST"], "data": rows}}, False
+
+    async def test_boards_are_bulk_loaded_concurrently_and_rows_hit_cache(self):
+        rows = [
+            {"secid": "SBER", "boardid": "TQBR", "asset_type": "stock"},
+            {"secid": "GAZP", "boardid": "TQBR", "asset_type": "stock"},
+            {"secid": "TMOS", "boardid": "TQTF", "asset_type": "stock"},
+            {"secid": "TGLD", "boardid": "TQTF", "asset_type": "stock"},
+        ]
+        with patch.object(moex_iss, "get_json_with_fallback_source", side_effect=self._fake_source):
+            out = await portfolio_service.fetch_prices_limited(
+                rows,
+                price_fetch_concurrency=4,
+                price_fetch_batch_size=10,
+            )
+        self.assertEqual(sorted(self.bulk_boards), ["tqbr", "tqtf"])
+        self.assertEqual(self.max_active, 2)
+        self.assertEqual([(row["secid"], price) for row, price in out], [(r["secid"], 10.0) for r in rows])
+
+    async def test_bulk_failure_falls_back_to_per_row_loads(self):
+        rows = [
+            {"secid": "SBER", "boardid": "TQBR", "asset_type": "stock"},
+            {"secid": "GAZP", "boardid": "TQBR", "asset_type": "stock"},
+        ]
+
+        async def source(session, path, params=None):
+            if "securities" in params:
+                raise aiohttp.ClientError("bulk down")
+            return {"marketdata": {"columns": ["LAST"], "data": [[5.0]]}}, False
+
+        with patch.object(moex_iss, "get_json_with_fallback_source", side_effect=source):
+            with self.assertLogs(portfolio_service.logger, "WARNING"):
+                out = await portfolio_service.fetch_prices_limited(
+                    rows,
+                    price_fetch_concurrency=2,
+                    price_fetch_batch_size=10,
+                )
+        self.assertEqual([price for _, price in out], [5.0, 5.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
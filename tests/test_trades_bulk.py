@@ -0,0 +1,58 @@
+import unittest
+
+from db import _bulk_insert_flags, _fold_positions, add_trades_bulk
+
+
+class BulkInsertFlagsTests(unittest.TestCase):
+    def test_duplicates_inside_batch_and_already_stored(self):
+        flags = _bulk_insert_flags(["t1", "t2", "t1", "t3", "t2"], {"t1", "t2"})
+        self.assertEqual(flags, [True, True, False, False, False])
+
+    def test_nothing_inserted(self):
+        self.assertEqual(_bulk_insert_flags(["t1", "t2"], set()), [False, False])
+
+
+class FoldPositionsTests(unittest.TestCase):
+    def test_matches_sequential_add_trade_math(self):
+        rows = [
+            (1, "10.01.2026", 10.0, 100.0, 1.0, "t1"),
+            (2, "10.01.2026", 3.0, 50.0, 0.5, "t2"),
+            (1, "11.01.2026", 5.0, 110.0, 0.5, "t3"),
+            (2, "12.01.2026", -3.0, 60.0, 0.5, "t4"),
+            (1, "13.01.2026", -4.0, 120.0, 1.0, "t6"),
+            # Reopened after the close above: the cost basis starts from scratch.
+            (2, "14.01.2026", 2.0, 55.0, 0.0, "t7"),
+        ]
+        state = _fold_positions({}, rows, [True] * len(rows))
+        self.assertEqual(state[1], (11.0, 1001.0 + 550.5 - 479.0))
+        self.assertEqual(state[2], (2.0, 110.0))
+
+    def test_skips_duplicates_and_starts_from_current_state(self):
+        rows = [
+            (1, "10.01.2026", 10.0, 100.0, 1.0, "t1"),
+            (1, "12.01.2026", 2.0, 90.0, 0.0, "t4"),
+            (3, "12.01.2026", -1.0, 10.0, 0.0, "t5"),
+        ]
+        current = {1: (10.0, 1001.0), 3: (1.0, 9.0)}
+        state = _fold_positions(current, rows, [False, True, True])
+        self.assertEqual(state, {1: (12.0, 1181.0), 3: (0.0, 0.0)})
+        self.assertEqual(current, {1: (10.0, 1001.0), 3: (1.0, 9.0)})
+
+
+class AddTradesBulkValidationTests(unittest.IsolatedAsyncioTestCase):
+    async def test_missing_external_trade_id_is_rejected(self):
+        for external_id in (None, ""):
+            with self.subTest(external_id=external_id):
+                with self.assertRaises(ValueError):
+                    await add_trades_bulk(
+                        "postgresql://unused",
+                        1,
+                        [
+                            (1, "10.01.2026", 1.0, 10.0, 0.0, "t1"),
+                            (1, "10.01.2026", 1.0, 10.0, 0.0, external_id),
+                        ],
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import time
+import unittest
+
+import asyncpg
+from dotenv import load_dotenv
+
+from db import (
+    add_trade,
+    add_trades_bulk,
+    close_pools,
+    get_user_positions,
+    init_db,
+    upsert_instrument,
+    upsert_instruments_bulk,
+)
+
+
+class TradesBulkDbIntegrationTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        load_dotenv()
+        self.db_dsn = (
+            os.getenv("TEST_DATABASE_URL")
+            or os.getenv("DATABASE_URL")
+            or os.getenv("DB_DSN")
+            or ""
+        ).strip()
+        if not self.db_dsn:
+            self.skipTest("DATABASE_URL/TEST_DATABASE_URL/DB_DSN is not set")
+
+        suffix = int(time.time() * 1000) % 10**11
+        self.bulk_user_id = int(f"96{suffix:011d}")
+        self.seq_user_id = self.bulk_user_id + 1
+        self.secids = [f"TBA{suffix}", f"TBB{suffix}", f"TBC{suffix}"]
+        await init_db(self.db_dsn)
+
+    async def asyncTearDown(self):
+        if not self.db_dsn:
+            return
+        conn = await asyncpg.connect(dsn=self.db_dsn)
+        try:
+            for user_id in (self.bulk_user_id, self.seq_user_id):
+                await conn.execute("DELETE FROM trades WHERE user_id = $1", user_id)
+                await conn.execute("DELETE FROM users WHERE telegram_user_id = $1", user_id)
+            await conn.execute("DELETE FROM instruments WHERE secid = ANY($1::text[])", self.secids)
+        finally:
+            await conn.close()
+        await close_pools()
+
+    async def _instrument_ids(self) -> tuple[int, int, int]:
+        a, b, c = self.secids
+        ids = await upsert_instruments_bulk(
+            self.db_dsn,
+            [
+                (a, "RU000A", "TQBR", "Alpha", "stock"),
+                (b, "RU000B", "TQBR", None, "stock"),
+                (b, None, "TQBR", "Beta", "stock"),
+                (c, None, "CETS", "Gold", "metal"),
+            ],
+        )
+        return ids[(a, "TQBR", "stock")], ids[(b, "TQBR", "stock")], ids[(c, "", "metal")]
+
+    async def _positions(self, user_id: int) -> dict[str, tuple[float, float, float]]:
+        rows = await get_user_positions(self.db_dsn, user_id)
+        return {r["secid"]: (r["total_qty"], r["total_cost"], r["avg_price"]) for r in rows}
+
+    async def _import_sequential(self, rows) -> list[bool]:
+        flags = []
+        for instrument_id, trade_date, qty, price, commission, external_id in rows:
+            flags.append(
+                await add_trade(
+                    self.db_dsn,
+                    self.seq_user_id,
+                    instrument_id,
+                    trade_date,
+                    qty,
+                    price,
+                    commission,
+                    external_trade_id=external_id,
+                    import_source="test.xml",
+                )
+            )
+        return flags
+
+    def _assert_same_positions(self, bulk: dict, seq: dict) -> None:
+        self.assertEqual(set(bulk), set(seq))
+        for secid, (qty, cost, avg) in bulk.items():
+            self.assertAlmostEqual(qty, seq[secid][0])
+            self.assertAlmostEqual(cost, seq[secid][1])
+            # add_trade leaves avg_price at 0 on a freshly opened position; the bulk path always fills it.
+            self.assertAlmostEqual(avg, cost / qty)
+
+    async def test_upsert_instruments_bulk_matches_single_upsert(self):
+        id_a, id_b, id_c = await self._instrument_ids()
+        a, b, c = self.secids
+        self.assertEqual(await upsert_instrument(self.db_dsn, a, None, "TQBR", None, "stock"), id_a)
+        self.assertEqual(await upsert_instrument(self.db_dsn, b, None, " TQBR ", None, "stock"), id_b)
+        self.assertEqual(await upsert_instrument(self.db_dsn, c, None, "CETS", None, "metal"), id_c)
+
+        conn = await asyncpg.connect(dsn=self.db_dsn)
+        try:
+            row = await conn.fetchrow("SELECT isin, shortname FROM instruments WHERE id = $1", id_b)
+        finally:
+            await conn.close()
+        # Duplicates in one batch are merged, and NULLs never overwrite known values.
+        self.assertEqual((row["isin"], row["shortname"]), ("RU000B", "Beta"))
+
+    async def test_bulk_import_matches_sequential_import(self):
+        id_a, id_b, id_c = await self._instrument_ids()
+        a, b, c = self.secids
+        rows = [
+            (id_a, "10.01.2026", 10.0, 100.0, 1.0, "t1"),
+            (id_b, "10.01.2026", 3.0, 50.0, 0.5, "t2"),
+            (id_a, "11.01.2026", 5.0, 110.0, 0.5, "t3"),
+            (id_b, "12.01.2026", -3.0, 60.0, 0.5, "t4"),
+            (id_c, "12.01.2026", 2.0, 7000.0, 0.0, "t5"),
+            (id_a, "13.01.2026", -4.0, 120.0, 1.0, "t6"),
+            # Reopened after the close above: the cost basis starts from scratch.
+            (id_b, "14.01.2026", 2.0, 55.0, 0.0, "t7"),
+        ]
+        bulk_flags = await add_trades_bulk(self.db_dsn, self.bulk_user_id, rows, import_source="test.xml")
+        seq_flags = await self._import_sequential(rows)
+        self.assertEqual(bulk_flags, [True] * len(rows))
+        self.assertEqual(seq_flags, bulk_flags)
+
+        bulk = await self._positions(self.bulk_user_id)
+        seq = await self._positions(self.seq_user_id)
+        self._assert_same_positions(bulk, seq)
+        self.assertAlmostEqual(bulk[a][0], 11.0)
+        self.assertAlmostEqual(bulk[b][1], 110.0)
+        self.assertAlmostEqual(bulk[c][0], 2.0)
+
+    async def test_reimport_with_duplicates_and_closed_position(self):
+        id_a, id_b, _ = await self._instrument_ids()
+        a, b, _ = self.secids
+        first = [
+            (id_a, "10.01.2026", 10.0, 100.0, 1.0, "t1"),
+            (id_b, "10.01.2026", 3.0, 50.0, 0.5, "t2"),
+        ]
+        await add_trades_bulk(self.db_dsn, self.bulk_user_id, first, import_source="test.xml")
+        await self._import_sequential(first)
+
+        second = [
+            (id_a, "10.01.2026", 10.0, 100.0, 1.0, "t1"),
+            (id_b, "11.01.2026", -3.0, 60.0, 0.5, "t3"),
+            (id_a, "12.01.2026", 2.0, 90.0, 0.0, "t4"),
+            (id_a, "12.01.2026", 2.0, 90.0, 0.0, "t4"),
+        ]
+        bulk_flags = await add_trades_bulk(self.db_dsn, self.bulk_user_id, second, import_source="test.xml")
+        seq_flags = await self._import_sequential(second)
+        self.assertEqual(bulk_flags, [False, True, True, False])
+        self.assertEqual(seq_flags, bulk_flags)
+
+        bulk = await self._positions(self.bulk_user_id)
+        seq = await self._positions(self.seq_user_id)
+        self._assert_same_positions(bulk, seq)
+        self.assertNotIn(b, bulk)
+        self.assertAlmostEqual(bulk[a][0], 12.0)
+        self.assertAlmostEqual(bulk[a][1], 1181.0)
+
+        again = await add_trades_bulk(self.db_dsn, self.bulk_user_id, second, import_source="test.xml")
+        self.assertEqual(again, [False] * len(second))
+        self.assertEqual(await self._positions(self.bulk_user_id), bulk)
+
+
+if __name__ == "__main__":
+    unittest.main()